@@ -0,0 +1,182 @@
+"""Benchmark the read endpoints of the API in process.
+
+Drives the FastAPI app through its test client against a database made by
+`synthetic_data.py` and records, for every scenario, the p50/p95/p99 latency,
+throughput and the peak RSS of the process in a JSON file, so results can be
+compared between commits. Scenarios cover the companies list at several page
+depths and with filters (the API has no search endpoint, the filtered list is
+the closest to it), companies, company images and addresses by id, the company
+images list, the addresses list and the change feed.
+
+Usage: python bench_api.py --db bench.db --requests 200 --output bench_api.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+
+PAGE_SIZE = 9  # Page size of the frontend, see frontend/src/contants.js
+PAGE_DEPTHS = (1, 10, 100, 1000, 10000)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_scenarios(db_path, seed):
+    """Return `{name: function returning the next URL}` for the data in `db_path`."""
+    conn = sqlite3.connect(db_path)
+    companies = conn.execute("SELECT count(*), max(id) FROM companies").fetchone()
+    # Image ids have gaps: companies without their own favicon share one
+    image_ids = [row[0] for row in conn.execute("SELECT id FROM company_images")]
+    max_address_id = conn.execute("SELECT max(id) FROM addresses").fetchone()[0]
+    max_seq = conn.execute("SELECT max(seq) FROM changes").fetchone()[0] or 0
+    conn.close()
+
+    rng = random.Random(seed)
+    last_page = max(1, -(-companies[0] // PAGE_SIZE))
+    scenarios = {}
+
+    for depth in PAGE_DEPTHS:
+        if depth < last_page:
+            scenarios[f"companies_page_{depth}"] = (
+                lambda depth=depth: f"/companies/?page={depth}&size={PAGE_SIZE}")
+    # Rows of the last page are read after skipping almost the whole table
+    scenarios["companies_page_last"] = lambda: f"/companies/?page={last_page}&size={PAGE_SIZE}"
+    scenarios["companies_filtered"] = lambda: (
+        f"/companies/?number_of_employees_id={rng.randint(1, 8)}&year_founded_from=1990"
+        f"&has_social_link=true&sort=-year_founded&page={rng.randint(1, 20)}&size={PAGE_SIZE}")
+    scenarios["companies_without_image"] = lambda: (
+        f"/companies/?has_image=false&page={rng.randint(1, 20)}&size={PAGE_SIZE}")
+    scenarios["company_by_id"] = lambda: f"/companies/{rng.randint(1, companies[1])}"
+    scenarios["company_image_by_id"] = lambda: f"/company-images/{rng.choice(image_ids)}"
+    scenarios["company_images_list"] = lambda: "/companies-images/"
+    scenarios["address_by_id"] = lambda: f"/addresses/{rng.randint(1, max_address_id)}"
+    scenarios["addresses_list_expanded"] = lambda: (
+        f"/addresses/?expand=city,country&page={rng.randint(1, 100)}&size=50")
+    scenarios["changes_feed"] = lambda: f"/changes/?since={rng.randint(0, max_seq)}&limit=100"
+
+    return scenarios
+
+
+def run_scenario(client, next_url, requests, warmup, max_seconds):
+    """Request `requests` URLs (fewer if `max_seconds` runs out) and summarize latencies."""
+    for _ in range(warmup):
+        client.get(next_url())
+
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+
+    while len(latencies) < requests:
+        url = next_url()
+        request_start = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - request_start)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        # Slow scenarios stop early, but keep enough samples for percentiles
+        if time.perf_counter() - start > max_seconds and len(latencies) >= 5:
+            break
+
+    elapsed = time.perf_counter() - start
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+
+    return {
+        "requests": len(latencies),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="bench.db",
+                        help="database generated by synthetic_data.py")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5,
+                        help="unmeasured requests per scenario")
+    parser.add_argument("--max-seconds", type=float, default=30,
+                        help="time limit of one scenario")
+    parser.add_argument("--scenario", action="append",
+                        help="run only this scenario, can be repeated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_api.json")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist, generate it with synthetic_data.py")
+
+    # Must be set before the app (and its engine) is imported
+    os.environ["DATABASE_PATH"] = args.db
+    from fastapi.testclient import TestClient
+    from main import app
+
+    scenarios = build_scenarios(args.db, args.seed)
+    if args.scenario:
+        unknown = set(args.scenario) - scenarios.keys()
+        if unknown:
+            parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}. "
+                         f"Available: {', '.join(scenarios)}")
+        scenarios = {name: scenarios[name] for name in args.scenario}
+
+    conn = sqlite3.connect(args.db)
+    companies = conn.execute("SELECT count(*) FROM companies").fetchone()[0]
+    conn.close()
+
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": os.path.abspath(args.db),
+        "companies": companies,
+        "scenarios": {},
+    }
+
+    with TestClient(app) as client:
+        for name, next_url in scenarios.items():
+            result = run_scenario(client, next_url, args.requests,
+                                  args.warmup, args.max_seconds)
+            results["scenarios"][name] = result
+            print(f"{name:26} {result['requests']:6} req  p50 {result['p50_ms']:9.3f} ms  "
+                  f"p95 {result['p95_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms  "
+                  f"{result['requests_per_second']:8.1f} req/s  statuses {result['statuses']}")
+
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+
+    print(f"Peak RSS {results['peak_rss_mb']} MB, results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark the per-row cost of serializing read responses.
+
+Compares the previous path of read endpoints (load ORM objects, validate them
+through the `response_model` and encode with the standard json module, which is
+what FastAPI does for a `response_model`) with the fast path from `fast_json`
+(select plain columns and encode the dicts with orjson).
+
+Usage: python bench_serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import time
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from fast_json import fetch_rows, public_columns
+from models import Company, CompanyPublic
+
+
+def create_bench_engine(rows):
+    """Create an in-memory database filled with `rows` synthetic companies."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.add_all(
+            Company(
+                about=f"Company number {i} builds software for people who need it. " * 4,
+                year_founded=str(1950 + i % 70),
+                website=f"https://company-{i}.example.com",
+                canonical_website=f"company-{i}.example.com",
+                number_of_employees_id=1 + i % 8,
+                linkedin=f"https://www.linkedin.com/company/company-{i}",
+                facebook=None,
+                twitter=f"https://twitter.com/company{i}" if i % 2 else None,
+                image_id=i + 1,
+            )
+            for i in range(rows)
+        )
+        session.commit()
+
+    return engine
+
+
+def orm_response(session):
+    """Previous path: ORM objects, response_model validation, json encoding."""
+    adapter = TypeAdapter(list[CompanyPublic])
+    companies = session.exec(select(Company)).all()
+    validated = adapter.validate_python(companies, from_attributes=True)
+
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode("utf-8")
+
+
+def fast_response(session):
+    """Fast path: plain column rows encoded with orjson."""
+    rows = fetch_rows(session, select(*public_columns(Company, CompanyPublic)))
+
+    return orjson.dumps(rows)
+
+
+def measure(engine, serializer, repeat):
+    """Return the best wall time of `repeat` runs of `serializer`."""
+    best = None
+    for _ in range(repeat):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            serializer(session)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_bench_engine(args.rows)
+
+    with Session(engine) as session:
+        assert json.loads(orm_response(session)) == orjson.loads(
+            fast_response(session)), "Both paths must produce the same JSON"
+
+    before = measure(engine, orm_response, args.repeat)
+    after = measure(engine, fast_response, args.repeat)
+
+    print(f"{args.rows} companies, best of {args.repeat} runs")
+    print(f"ORM + response_model + json: {before * 1e6 / args.rows:8.2f} us/row")
+    print(f"columns + orjson:            {after * 1e6 / args.rows:8.2f} us/row")
+    print(f"speedup:                     {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
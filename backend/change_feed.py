@@ -0,0 +1,68 @@
+"""Change feed of companies and company images.
+
+Every insert, update and delete of a tracked table is recorded by SQLite triggers
+in the `changes` table, so API handlers, the favicon scraper and maintenance
+scripts all feed it without extra code. Each row keeps only its latest change:
+`INSERT OR REPLACE` on the unique (table_name, row_id) index drops the previous
+entry and the new one gets the next `seq`, which is never reused.
+"""
+
+TRACKED_TABLES = ("companies", "company_images")
+TRACKED_EVENTS = (("INSERT", "NEW", 0), ("UPDATE", "NEW", 0), ("DELETE", "OLD", 1))
+# Created by `change_feed_statements`, checked by `database.check_schema`
+CHANGE_FEED_TRIGGERS = tuple(
+    f"{table_name}_{event.lower()}_change" for table_name in TRACKED_TABLES for event, _, _ in TRACKED_EVENTS)
+
+CREATE_CHANGES_TABLE = """
+    CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name VARCHAR NOT NULL,
+        row_id INTEGER NOT NULL,
+        deleted BOOLEAN NOT NULL DEFAULT 0,
+        changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+CREATE_CHANGES_INDEX = """
+    CREATE UNIQUE INDEX IF NOT EXISTS ix_changes_row ON changes (table_name, row_id)
+"""
+
+
+def change_feed_statements():
+    """Return the SQL statements that create the `changes` table and its triggers."""
+    statements = [CREATE_CHANGES_TABLE, CREATE_CHANGES_INDEX]
+
+    for table_name in TRACKED_TABLES:
+        for event, row, deleted in TRACKED_EVENTS:
+            statements.append(f"""
+                CREATE TRIGGER IF NOT EXISTS {table_name}_{event.lower()}_change
+                AFTER {event} ON {table_name}
+                BEGIN
+                    INSERT OR REPLACE INTO changes (table_name, row_id, deleted)
+                    VALUES ('{table_name}', {row}.id, {deleted});
+                END
+            """)
+
+    return statements
+
+
+def create_change_feed(execute):
+    """Create the change feed with `execute`, a function running one SQL statement.
+
+    The tracked tables must already exist. Rows that exist when the triggers of their
+    table are created are recorded once as upserts, so reading the feed from the
+    beginning is a full sync.
+    """
+    new_tables = [
+        table_name for table_name in TRACKED_TABLES
+        if execute(f"SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = '{table_name}_insert_change'").fetchone() is None
+    ]
+
+    for statement in change_feed_statements():
+        execute(statement)
+
+    for table_name in new_tables:
+        execute(f"""
+            INSERT OR IGNORE INTO changes (table_name, row_id)
+            SELECT '{table_name}', id FROM {table_name} ORDER BY id
+        """)
@@ -1,18 +1,158 @@
+import os
 from typing import Annotated
 
 from fastapi import Depends
+from sqlalchemy import TextClause, event, exc, inspect
+from sqlalchemy.schema import CreateIndex
 from sqlmodel import Session, SQLModel, create_engine
 
+import models  # noqa: F401 -- imported to register all tables in SQLModel.metadata
+from change_feed import CHANGE_FEED_TRIGGERS, create_change_feed
+from own_image import OWN_IMAGE_TRIGGERS, create_own_image_flag
+from reference_versions import REFERENCE_VERSION_TRIGGERS, create_reference_versions
 
-sqlite_file_name = "companies.db"
+
+# Benchmarks point the API at a generated database, see bench_api.py
+sqlite_file_name = os.environ.get("DATABASE_PATH", "companies.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
+# Read replica mode: serve reads from a snapshot published by publish_replica.py.
+# The file is never written in place, so it is opened immutable (no locks, no
+# change detection) and memory-mapped, and all workers share the OS page cache.
+read_replica_path = os.environ.get("READ_REPLICA_PATH")
+read_replica_mmap_size = int(os.environ.get(
+    "READ_REPLICA_MMAP_SIZE", 1024 * 1024 * 1024))
+
 connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+
+# Tables and triggers created with raw SQL by the migration, not by the models
+RAW_SQL_OBJECTS = (
+    ("table", "reference_versions"),
+    *(("trigger", name) for name in OWN_IMAGE_TRIGGERS + CHANGE_FEED_TRIGGERS + REFERENCE_VERSION_TRIGGERS),
+)
+
+# Seconds a migration waits for another one to finish
+MIGRATION_LOCK_TIMEOUT = 600
+
+# Indexes that are no longer declared by the models, dropped by upgrade_tables.
+# The companies list indexes were replaced by indexes starting with has_own_image.
+OBSOLETE_INDEXES = ("ix_companies_employees", "ix_companies_employees_year",
+                    "ix_companies_year_founded", "ix_companies_image_id")
+
+if read_replica_path:
+    engine = create_engine(
+        f"sqlite:///file:{read_replica_path}?mode=ro&immutable=1&uri=true", connect_args=connect_args)
+
+    @event.listens_for(engine, "connect")
+    def open_read_replica(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"PRAGMA mmap_size = {read_replica_mmap_size}")
+        connection_record.info["replica_inode"] = os.stat(
+            read_replica_path).st_ino
+
+    @event.listens_for(engine, "checkout")
+    def check_read_replica(dbapi_connection, connection_record, connection_proxy):
+        # A new snapshot was published: reconnect instead of reading the old file
+        if os.stat(read_replica_path).st_ino != connection_record.info.get("replica_inode"):
+            raise exc.DisconnectionError("Read replica snapshot was replaced")
+else:
+    engine = create_engine(sqlite_url, connect_args=connect_args)
 
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    """Create the tables and upgrade an existing database to the models.
+
+    Run once per deployment with `python database.py`, before the API workers
+    start: the workers only check the schema. The whole migration holds the write
+    lock of the database, so a second run waits for the first one and then finds
+    nothing left to do.
+    """
+    if read_replica_path:
+        # The replica is a copy of the writer database, it is never migrated in place
+        return
+
+    with engine.connect() as connection:
+        # Backfilling a large database takes a while, wait for it instead of failing
+        connection.exec_driver_sql(f"PRAGMA busy_timeout = {MIGRATION_LOCK_TIMEOUT * 1000}")
+        # Taken before inspecting the database, so what is inspected cannot change
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        SQLModel.metadata.create_all(connection)
+        upgrade_tables(connection)
+        connection.commit()
+
+
+def check_schema():
+    """Raise RuntimeError if a table, column or index of the models is missing from the database.
+
+    The tables and triggers that the migration creates with raw SQL are checked too.
+    Without the triggers the API would serve stale image flags and change feed
+    without any error. A database that was not migrated, or a read replica published from an older
+    database, would otherwise fail on the first request that needs the missing part.
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+
+    for table in SQLModel.metadata.tables.values():
+        if table.name not in tables:
+            missing.append(table.name)
+            continue
+
+        columns = {column["name"]
+                   for column in inspector.get_columns(table.name)}
+        missing.extend(f"{table.name}.{column.name}"
+                       for column in table.columns if column.name not in columns)
+
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index.name for index in table.indexes if index.name not in indexes)
+
+    with engine.connect() as connection:
+        existing = set(connection.exec_driver_sql(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')").fetchall())
+    missing.extend(f"{kind} {name}" for kind, name in RAW_SQL_OBJECTS if (kind, name) not in existing)
+
+    if missing:
+        raise RuntimeError(
+            f"Database schema is out of date, missing: {', '.join(missing)}. Run python database.py to migrate it")
+
+
+def upgrade_tables(connection):
+    """Add columns, indexes and triggers declared after a table was created.
+
+    `create_all` skips tables that already exist, so new nullable columns and new
+    indexes have to be added to existing databases separately, and indexes removed
+    from the models have to be dropped. Every step can run again on an upgraded
+    database.
+    """
+    inspector = inspect(connection)
+
+    for table in SQLModel.metadata.tables.values():
+        columns = {column["name"]
+                   for column in inspector.get_columns(table.name)}
+
+        for column in table.columns:
+            if column.name not in columns:
+                column_type = column.type.compile(engine.dialect)
+                # SQLite only accepts constant defaults for new columns
+                default = column.server_default
+                if default is not None and isinstance(default.arg, TextClause):
+                    column_type += f" DEFAULT {default.arg.text}"
+                try:
+                    connection.exec_driver_sql(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                except exc.OperationalError as e:
+                    # Added by a migration that did not hold the lock
+                    if "duplicate column name" not in str(e.orig):
+                        raise
+
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+    for index_name in OBSOLETE_INDEXES:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index_name}")
+
+    create_own_image_flag(connection.exec_driver_sql)
+    create_change_feed(connection.exec_driver_sql)
+    create_reference_versions(connection.exec_driver_sql)
 
 
 def get_session():
@@ -21,3 +161,9 @@ def get_session():
 
 
 SessionDep = Annotated[Session, Depends(get_session)]
+
+
+if __name__ == "__main__":
+    create_db_and_tables()
+    check_schema()
+    print(f"Database {sqlite_file_name} is up to date.")
@@ -0,0 +1,78 @@
+from math import ceil
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from fastapi_pagination import resolve_params
+
+from sqlmodel import Session, func, select
+
+
+# Read endpoints return rows that came straight from our own database, they were
+# validated when written. Instead of loading ORM objects and validating them again
+# through `response_model`, they select plain columns and encode them with orjson.
+
+
+def public_columns(table, public_model):
+    """Return the columns of `table` that are exposed by `public_model`, in its field order."""
+    return [getattr(table, name) for name in public_model.model_fields]
+
+
+def field_columns(table, public_model, fields=None):
+    """Return the columns requested by a `fields=` sparse fieldset.
+
+    `fields` is a comma separated list of field names of `public_model`; all public
+    columns are returned when it is empty.
+    """
+    names = list(dict.fromkeys(
+        name.strip() for name in (fields or "").split(",") if name.strip()))
+    if not names:
+        return public_columns(table, public_model)
+
+    unknown = [name for name in names if name not in public_model.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid fields: {', '.join(unknown)}. Allowed fields: {', '.join(public_model.model_fields)}")
+
+    return [getattr(table, name) for name in names]
+
+
+def fetch_rows(session: Session, statement):
+    """Execute a column select and return the rows as dicts."""
+    return [dict(row) for row in session.connection().execute(statement).mappings()]
+
+
+def rows_response(session: Session, statement):
+    """Respond with all rows of a column select as a JSON list."""
+    return ORJSONResponse(fetch_rows(session, statement))
+
+
+def row_response(session: Session, statement, detail):
+    """Respond with the first row of a column select, 404 with `detail` if there is none."""
+    row = session.connection().execute(statement).mappings().first()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail=detail)
+
+    return ORJSONResponse(dict(row))
+
+
+def paginated_response(session: Session, statement):
+    """Respond with one page of a column select, in the same shape as `Page`.
+
+    Page parameters are resolved from the route's `Page` response model. Counting
+    and slicing happen in SQL, so only the requested page is loaded.
+    """
+    params = resolve_params()
+    total = session.exec(
+        select(func.count()).select_from(statement.order_by(None).subquery())).one()
+    raw_params = params.to_raw_params()
+    items = fetch_rows(session, statement.limit(
+        raw_params.limit).offset(raw_params.offset))
+
+    return ORJSONResponse({
+        "items": items,
+        "total": total,
+        "page": params.page,
+        "size": params.size,
+        "pages": ceil(total / params.size),
+    })
@@ -0,0 +1,128 @@
+"""Persistent queue of favicon refresh jobs, stored in the `favicon_jobs` table.
+
+The API enqueues jobs and `favicon_worker.py` claims and runs them. There is at
+most one job per company: enqueueing a company that is already queued does
+nothing, and enqueueing it while its job is running sets `requeue`, so the job is
+queued again once the running attempt finishes instead of being claimed by a
+second worker at the same time. Failed attempts are retried with an exponential delay.
+
+All functions take `execute`, a function running one SQL statement with qmark
+parameters, such as `sqlite3.Connection.execute` or SQLAlchemy's
+`Connection.exec_driver_sql`. Committing is left to the caller.
+"""
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30  # seconds before the first retry, doubled after every failure
+
+CREATE_FAVICON_JOBS_TABLE = """
+    CREATE TABLE IF NOT EXISTS favicon_jobs (
+        id INTEGER PRIMARY KEY,
+        company_id INTEGER NOT NULL UNIQUE,
+        status VARCHAR NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error VARCHAR,
+        run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        requeue BOOLEAN NOT NULL DEFAULT 0
+    )
+"""
+
+CREATE_FAVICON_JOBS_INDEX = """
+    CREATE INDEX IF NOT EXISTS ix_favicon_jobs_status_run_after ON favicon_jobs (status, run_after)
+"""
+
+
+def create_favicon_queue(execute):
+    """Create the `favicon_jobs` table if it does not exist, or add its new columns."""
+    execute(CREATE_FAVICON_JOBS_TABLE)
+    execute(CREATE_FAVICON_JOBS_INDEX)
+
+    columns = [column[1] for column in execute("PRAGMA table_info(favicon_jobs)").fetchall()]
+    if "requeue" not in columns:
+        execute("ALTER TABLE favicon_jobs ADD COLUMN requeue BOOLEAN NOT NULL DEFAULT 0")
+
+
+def enqueue_favicon_job(execute, company_id):
+    """Queue a favicon refresh for a company and return the job id."""
+    job = execute("""
+        INSERT INTO favicon_jobs (company_id, status, attempts, run_after, updated_at)
+        VALUES (?, 'queued', 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ON CONFLICT (company_id) DO UPDATE
+        SET status = 'queued', attempts = 0, last_error = NULL,
+            run_after = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE status NOT IN ('queued', 'running')
+        RETURNING id
+    """, (company_id,)).fetchall()
+
+    if not job:
+        # Already queued, or running: queue it again when the attempt finishes
+        execute("""
+            UPDATE favicon_jobs SET requeue = 1, updated_at = CURRENT_TIMESTAMP
+            WHERE company_id = ? AND status = 'running'
+        """, (company_id,))
+        job = execute(
+            "SELECT id FROM favicon_jobs WHERE company_id = ?", (company_id,)).fetchall()
+
+    return job[0][0]
+
+
+def claim_favicon_job(execute):
+    """Mark the next due job as running and return `(job_id, company_id)`, or None."""
+    job = execute("""
+        UPDATE favicon_jobs
+        SET status = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM favicon_jobs
+            WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+            ORDER BY run_after, id
+            LIMIT 1
+        )
+        RETURNING id, company_id
+    """).fetchall()
+
+    return job[0] if job else None
+
+
+def finish_favicon_job(execute, job_id, error=None, retry=True):
+    """Record the outcome of a running job.
+
+    A failed job is queued again after `RETRY_DELAY * 2 ** (attempts - 1)` seconds
+    until it reaches `MAX_ATTEMPTS`, or right away marked failed if `retry` is false.
+    A job that was enqueued again while running is queued again right away, with
+    its attempts reset, whatever the outcome.
+    """
+    requeued = execute("""
+        UPDATE favicon_jobs
+        SET status = 'queued', requeue = 0, attempts = 0, last_error = NULL,
+            run_after = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'running' AND requeue
+        RETURNING id
+    """, (job_id,)).fetchall()
+    if requeued:
+        return
+
+    if error is None:
+        execute("""
+            UPDATE favicon_jobs
+            SET status = 'done', last_error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'running'
+        """, (job_id,))
+        return
+
+    execute("""
+        UPDATE favicon_jobs
+        SET status = CASE WHEN ? AND attempts < ? THEN 'queued' ELSE 'failed' END,
+            run_after = datetime(CURRENT_TIMESTAMP, '+' || (? * (1 << (attempts - 1))) || ' seconds'),
+            last_error = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'running'
+    """, (retry, MAX_ATTEMPTS, RETRY_DELAY, error, job_id))
+
+
+def requeue_stale_favicon_jobs(execute):
+    """Queue again the jobs left running by a worker that stopped."""
+    execute("""
+        UPDATE favicon_jobs
+        SET status = 'queued', requeue = 0, updated_at = CURRENT_TIMESTAMP
+        WHERE status = 'running'
+    """)
@@ -1,26 +1,50 @@
+from contextlib import asynccontextmanager, contextmanager
 from enum import Enum
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
-from sqlmodel import select, func
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import func, select
 
-from fastapi_pagination import Page, add_pagination, paginate
+from fastapi_pagination import Page, add_pagination
 
-from database import SessionDep
+from database import SessionDep, check_schema, engine, read_replica_path
+from fast_json import fetch_rows, field_columns, paginated_response, public_columns, row_response, rows_response
+from favicon_queue import enqueue_favicon_job
+from metrics import MetricsMiddleware, instrument_engine, render_metrics
 from models import *
+from queries import CompanySort, addresses_list_query, companies_list_query
+from snapshot import snapshot_cache
+from warmup import reference_cache, warm_up
+from websites import canonicalize_website
 
 
 class Tags(Enum):
     addresses = 'Addresses'
+    changes = 'Changes'
     cities = 'Cities'
     companies = 'Companies'
     company_images = 'Company Images'
     countries = 'Countries'
+    favicon_jobs = 'Favicon jobs'
     industries = 'Industries'
     number_of_employees = 'Number of employees'
 
 
+# Tables tracked by the change feed, see change_feed.TRACKED_TABLES
+CHANGE_FEED_TABLES = {
+    'companies': (Company, CompanyPublic),
+    'company_images': (CompanyImage, CompanyImagePublic),
+}
+
+# Related tables that can be joined into the addresses list: expand name -> (table, foreign key)
+ADDRESS_EXPANSIONS = {
+    'city': (City, Address.city_id),
+    'country': (Country, Address.country_id),
+}
+
 origins = [
     "https://d47af803.osint-agency-online.pages.dev",
     "https://2b75ca62.osint-agency-online.pages.dev",
@@ -28,7 +52,20 @@ origins = [
     "http://localhost:4321",
 ]
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers start serving only once this is done, with a warm pool and caches.
+    # The database is migrated before by `python database.py`, once for all workers
+    check_schema()
+    app.state.warmup = warm_up(engine)
+
+    yield
+
+    reference_cache.close()
+    engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -37,6 +74,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 add_pagination(app)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+
+
+if read_replica_path:
+    @app.middleware("http")
+    async def reject_writes_on_read_replica(request: Request, call_next):
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            return ORJSONResponse(status_code=405, content={"detail": "This server is a read-only replica"})
+
+        return await call_next(request)
+
+
+@app.get('/metrics', include_in_schema=False)
+async def read_metrics():
+    """Request latency and SQL query metrics of this worker in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get('/ready', include_in_schema=False)
+async def read_readiness(request: Request, session: SessionDep):
+    """Readiness of this worker: 200 once warmed up and able to query the database, 503 otherwise"""
+    warmup = getattr(request.app.state, "warmup", None)
+    if warmup is None:
+        return ORJSONResponse(status_code=503, content={"status": "starting"})
+
+    try:
+        session.connection().exec_driver_sql("SELECT 1")
+    except Exception as e:
+        return ORJSONResponse(status_code=503, content={"status": "database unavailable", "detail": str(e)})
+
+    return ORJSONResponse({"status": "ready", "warmup": warmup})
 
 
 @app.post('/addresses/', response_model=AddressPublic, status_code=201, tags=[Tags.addresses], summary="Create an address")
@@ -72,26 +141,52 @@ async def create_address(address: AddressBase, session: SessionDep):
     return db_address
 
 
-@app.get('/addresses/', tags=[Tags.addresses], summary="Get all addresses")
-async def read_addresses(session: SessionDep) -> Page[AddressPublic]:
-    """Retrieve a paginated list of all addresses. You can choose page and how many addresses will be displayed in each page"""
-    addresses = session.exec(select(Address)).all()
+@app.get('/addresses/', response_model=Page[AddressPublicWithNames], tags=[Tags.addresses], summary="Get all addresses")
+async def read_addresses(
+    session: SessionDep,
+    fields: str | None = None,
+    expand: str | None = None,
+    city_id: int | None = None,
+    country_id: int | None = None,
+    type: str | None = None,
+):
+    """Retrieve a paginated list of all addresses. You can choose page and how many addresses will be displayed in each page
+
+    - **fields**: comma separated list of address fields to return, for example: id,street,type (not required)
+    - **expand**: comma separated list of "city" and "country", adds city_name and country_name to each address (not required)
+    - **city_id**: only addresses in this city (not required)
+    - **country_id**: only addresses in this country (not required)
+    - **type**: only addresses of this type, for example: headquarters (not required)
+    """
+    expand_names = {name.strip() for name in (expand or "").split(",") if name.strip()}
+    unknown = expand_names - ADDRESS_EXPANSIONS.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid expand: {', '.join(sorted(unknown))}. Allowed values: {', '.join(ADDRESS_EXPANSIONS)}")
+
+    addresses_query = addresses_list_query(
+        field_columns(Address, AddressPublic, fields), city_id, country_id, type)
+
+    # Names are joined in the same query instead of one request per city and country
+    for name, (table, foreign_key) in ADDRESS_EXPANSIONS.items():
+        if name in expand_names:
+            addresses_query = addresses_query.outerjoin(
+                table, table.id == foreign_key).add_columns(table.name.label(f"{name}_name"))
 
-    return paginate(addresses)
+    return paginated_response(session, addresses_query)
 
 
-@app.get('/addresses/{Address_id}', response_model=AddressPublic, tags=[Tags.addresses], summary="Get an address by id")
-async def get_address(address_id: int, session: SessionDep):
+@app.get('/addresses/{address_id}', response_model=AddressPublic, tags=[Tags.addresses], summary="Get an address by id")
+async def get_address(address_id: int, session: SessionDep, fields: str | None = None):
     """Retrieve an address information by its ID:
 
     - **address_id**: The ID of the address to retrieve.
+    - **fields**: comma separated list of address fields to return (not required)
     """
-    address = session.get(Address, address_id)
-
-    if not address:
-        raise HTTPException(status_code=404, detail="address not found")
+    address_query = select(
+        *field_columns(Address, AddressPublic, fields)).where(Address.id == address_id)
 
-    return address
+    return row_response(session, address_query, "address not found")
 
 
 @app.patch('/addresses/{address_id}', response_model=AddressPublic, tags=[Tags.addresses], summary="Update an address by id")
@@ -138,6 +233,51 @@ async def delete_address(address_id: int, session: SessionDep):
     return {"ok": True}
 
 
+@app.get('/changes/', tags=[Tags.changes], summary="Get changes of companies and company images")
+async def read_changes(session: SessionDep, since: int = Query(default=0, ge=0), limit: int = Query(default=100, ge=1, le=1000)):
+    """Retrieve companies and company images changed after a cursor, oldest change first:
+
+    - **since**: cursor returned by the previous call, 0 to start from the beginning (default: 0)
+    - **limit**: how many changes to return at most (default: 100)
+
+    Each change is an "upsert" with the current data of the row or a "delete" tombstone. Only the latest change of each row is kept.
+    Call again with the returned cursor while has_more is true.
+    """
+    changes = session.exec(
+        select(Change).where(Change.seq > since).order_by(Change.seq).limit(limit + 1)).all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    # Current data of the changed rows, one query per table
+    rows = {}
+    for table_name, (table, public_model) in CHANGE_FEED_TABLES.items():
+        row_ids = [change.row_id for change in changes
+                   if change.table_name == table_name and not change.deleted]
+        if row_ids:
+            rows_query = select(
+                *public_columns(table, public_model)).where(table.id.in_(row_ids))
+            rows[table_name] = {row['id']: row for row in fetch_rows(session, rows_query)}
+
+    items = []
+    for change in changes:
+        data = rows.get(change.table_name, {}).get(change.row_id)
+        items.append({
+            "seq": change.seq,
+            "table": change.table_name,
+            "id": change.row_id,
+            # A row deleted after this change was read gets its tombstone in a later change
+            "op": "upsert" if data is not None else "delete",
+            "changed_at": change.changed_at,
+            "data": data,
+        })
+
+    return ORJSONResponse({
+        "changes": items,
+        "cursor": changes[-1].seq if changes else since,
+        "has_more": has_more,
+    })
+
+
 @app.post('/cities/', response_model=CityPublic, status_code=201, tags=[Tags.cities], summary="Create a city")
 async def create_city(city: CityBase, session: SessionDep):
     """Create a city with name value: 
@@ -152,12 +292,12 @@ async def create_city(city: CityBase, session: SessionDep):
     return db_city
 
 
-@app.get('/cities/', tags=[Tags.cities], summary="Get all cities")
-async def read_cities(session: SessionDep) -> Page[CityPublic]:
+@app.get('/cities/', response_model=Page[CityPublic], tags=[Tags.cities], summary="Get all cities")
+async def read_cities(session: SessionDep):
     """Retrieve a paginated list of all cities. You can choose page and how many cities will be displayed in each page"""
-    cities = session.exec(select(City)).all()
+    cities_query = select(*public_columns(City, CityPublic)).order_by(City.id)
 
-    return paginate(cities)
+    return paginated_response(session, cities_query)
 
 
 @app.get('/cities/{city_id}', response_model=CityPublic, tags=[Tags.cities], summary="Get a city by id")
@@ -211,6 +351,32 @@ async def delete_city(city_id: int, session: SessionDep):
     return {"ok": True}
 
 
+def get_company_by_canonical_website(session, canonical_website):
+    """Return the company registered under the canonical form of a website, if any."""
+    if not canonical_website:
+        return None
+
+    return session.exec(
+        select(Company).where(Company.canonical_website == canonical_website)).first()
+
+
+@contextmanager
+def duplicate_website_conflict(session):
+    """Answer 409 when a concurrent request stored the same canonical website first.
+
+    The lookups before writing only catch duplicates that are already committed,
+    the unique index on `canonical_website` catches the others.
+    """
+    try:
+        yield
+    except IntegrityError as e:
+        session.rollback()
+        if "canonical_website" not in str(e.orig):
+            raise
+        raise HTTPException(
+            status_code=409, detail="Company with this website already exists")
+
+
 @app.post("/companies/", response_model=CompanyPublic, status_code=201, tags=[Tags.companies], summary="Create a company")
 async def create_company(company: CompanyBase, session: SessionDep):
     """Create a company with all information:
@@ -230,50 +396,78 @@ async def create_company(company: CompanyBase, session: SessionDep):
             raise HTTPException(
                 status_code=400, detail="Invalid number_of_employees_id: Number of employees does not exist")
 
+    canonical_website = canonicalize_website(company.website)
+    if get_company_by_canonical_website(session, canonical_website):
+        raise HTTPException(
+            status_code=409, detail="Company with this website already exists")
+
     db_company = Company.model_validate(company)
+    db_company.canonical_website = canonical_website
     session.add(db_company)
-    session.commit()
+    with duplicate_website_conflict(session):
+        session.flush()
+        # The favicon worker picks the company up as soon as it is committed
+        enqueue_favicon_job(session.connection().exec_driver_sql, db_company.id)
+        session.commit()
     session.refresh(db_company)
 
     return db_company
 
 
-@app.get("/companies/", tags=[Tags.companies], summary="Get all companies")
-async def read_companies(session: SessionDep) -> Page[CompanyPublic]:
-    """Retrieve a paginated list of all companies. You can choose page and how many companies will be displayed in each page"""
-    # Filter companies where the image_id column is not null
-    # Subquery to group by image_id and count occurrences
-    image_count_subquery = (
-        select(Company.image_id, func.count(Company.image_id).label("count"))
-        .where(Company.image_id.is_not(None))
-        .group_by(Company.image_id)
-        .subquery()
-    )
-
-    # Query to get companies with unique image_id
-    companies_query = (
-        select(Company)
-        .join(image_count_subquery, Company.image_id == image_count_subquery.c.image_id)
-        .where(image_count_subquery.c.count == 1)
-    )
-
-    companies = session.exec(companies_query).all()
+def company_columns(fields, about_max_len):
+    """Columns of a company sparse fieldset, with `about` cut to `about_max_len` characters in SQL."""
+    columns = field_columns(Company, CompanyPublic, fields)
+
+    if about_max_len is None:
+        return columns
+
+    return [
+        func.substr(Company.about, 1, about_max_len).label('about') if column is Company.about else column
+        for column in columns
+    ]
+
+
+@app.get("/companies/", response_model=Page[CompanyPublic], tags=[Tags.companies], summary="Get all companies")
+async def read_companies(
+    session: SessionDep,
+    fields: str | None = None,
+    about_max_len: int | None = Query(default=None, ge=1),
+    number_of_employees_id: int | None = None,
+    year_founded_from: int | None = Query(default=None, ge=0, le=9999),
+    year_founded_to: int | None = Query(default=None, ge=0, le=9999),
+    has_social_link: bool | None = None,
+    has_image: bool = True,
+    sort: CompanySort = CompanySort.id,
+):
+    """Retrieve a paginated list of all companies. You can choose page and how many companies will be displayed in each page
+
+    - **fields**: comma separated list of company fields to return, for example: id,website,year_founded,about,image_id (not required)
+    - **about_max_len**: cut "about" to this amount of characters (not required)
+    - **number_of_employees_id**: only companies of this group of number of employees (not required)
+    - **year_founded_from**, **year_founded_to**: only companies founded in this range of years, bounds included (not required)
+    - **has_social_link**: only companies with (true) or without (false) a LinkedIn, Facebook or Twitter link (not required)
+    - **has_image**: only companies with their own logo (true, default) or without it (false)
+    - **sort**: id, -id, year_founded or -year_founded, "-" sorts in descending order (default: id)
+    """
+    companies_query = companies_list_query(
+        company_columns(fields, about_max_len), number_of_employees_id, year_founded_from,
+        year_founded_to, has_social_link, has_image, sort)
 
-    return paginate(companies)
+    return paginated_response(session, companies_query)
 
 
 @app.get("/companies/{company_id}", response_model=CompanyPublic, tags=[Tags.companies], summary="Get a company by id")
-async def get_company(company_id: int, session: SessionDep):
+async def get_company(company_id: int, session: SessionDep, fields: str | None = None, about_max_len: int | None = Query(default=None, ge=1)):
     """Retrieve a company information by its ID:
 
     - **company_id**: The ID of the company to retrieve.
+    - **fields**: comma separated list of company fields to return (not required)
+    - **about_max_len**: cut "about" to this amount of characters (not required)
     """
-    company = session.get(Company, company_id)
+    company_query = select(
+        *company_columns(fields, about_max_len)).where(Company.id == company_id)
 
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-
-    return company
+    return row_response(session, company_query, "Company not found")
 
 
 @app.patch('/companies/{company_id}', response_model=CompanyPublic, tags=[Tags.companies], summary="Update a company by id")
@@ -295,10 +489,23 @@ async def update_company(company_id: int, company: CompanyBase, session: Session
     if not company_db:
         raise HTTPException(status_code=404, detail="Company not found")
 
+    canonical_website = canonicalize_website(company.website)
+    duplicate = get_company_by_canonical_website(session, canonical_website)
+    if duplicate and duplicate.id != company_id:
+        raise HTTPException(
+            status_code=409, detail="Company with this website already exists")
+
+    website_changed = company_db.website != company.website
+
     company_data = company.model_dump(exclude_unset=True)
     company_db.sqlmodel_update(company_data)
+    company_db.canonical_website = canonical_website
     session.add(company_db)
-    session.commit()
+    with duplicate_website_conflict(session):
+        session.flush()
+        if website_changed:
+            enqueue_favicon_job(session.connection().exec_driver_sql, company_id)
+        session.commit()
     session.refresh(company_db)
 
     return company_db
@@ -321,12 +528,63 @@ def delete_company(company_id: int, session: SessionDep):
     return {"ok": True}
 
 
+@app.post("/companies/{company_id}/refresh-favicon", response_model=FaviconJobPublic, status_code=202, tags=[Tags.favicon_jobs], summary="Refresh the favicon of a company")
+async def refresh_company_favicon(company_id: int, session: SessionDep):
+    """Queue a job that downloads the favicon of a company again:
+
+    - **company_id**: The ID of the company to refresh.
+
+    A company that is already queued is not queued twice. Follow the job with "Get a favicon job by id".
+    """
+    if not session.get(Company, company_id):
+        raise HTTPException(status_code=404, detail="Company not found")
+
+    job_id = enqueue_favicon_job(session.connection().exec_driver_sql, company_id)
+    session.commit()
+
+    return session.get(FaviconJob, job_id)
+
+
+@app.get("/favicon-jobs/{job_id}", response_model=FaviconJobPublic, tags=[Tags.favicon_jobs], summary="Get a favicon job by id")
+async def get_favicon_job(job_id: int, session: SessionDep):
+    """Retrieve the status of a favicon job by its ID:
+
+    - **job_id**: The ID of the favicon job to retrieve.
+
+    The status is "queued", "running", "done" or "failed". Failed attempts are retried with a growing delay before the job is marked "failed".
+    """
+    favicon_job = session.get(FaviconJob, job_id)
+
+    if not favicon_job:
+        raise HTTPException(status_code=404, detail="Favicon job not found")
+
+    return favicon_job
+
+
+@app.get("/snapshot/", tags=[Tags.companies], summary="Get a snapshot of all companies")
+async def read_snapshot(request: Request, session: SessionDep, page_size: int = Query(default=9, ge=1, le=100)):
+    """Retrieve all companies shown in the directory, with their image URLs, in one versioned snapshot for the static site build:
+
+    - **page_size**: how many companies are in each page of the snapshot (default: 9)
+
+    Send the snapshot version in the "If-None-Match" header to get 304 Not Modified when nothing changed.
+    """
+    version, body = snapshot_cache.get(session, page_size)
+    headers = {"ETag": f'"{version}"'}
+
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    return Response(body, media_type="application/json", headers=headers)
+
+
 @app.get("/companies-images/", response_model=list[CompanyImagePublic], tags=[Tags.company_images], summary="Get all company images")
 async def read_company_images(session: SessionDep):
     """Retrieve a paginated list of all companies. You can choose page and how many companies will be displayed in each page"""
-    company_images = session.exec(select(CompanyImage)).all()
+    company_images_query = select(
+        *public_columns(CompanyImage, CompanyImagePublic)).order_by(CompanyImage.id)
 
-    return company_images
+    return rows_response(session, company_images_query)
 
 
 @app.get('/company-images/{company_image_id}', response_model=CompanyImagePublic, tags=[Tags.company_images], summary="Get a company image by id")
@@ -360,9 +618,7 @@ async def create_country(country: CountryBase, session: SessionDep):
 @app.get('/countries/', response_model=list[CountryPublic], tags=[Tags.countries], summary="Get all countries")
 async def read_countries(session: SessionDep):
     """Retrieve a paginated list of all countries. You can choose page and how many countries will be displayed in each page"""
-    countries = session.exec(select(Country)).all()
-
-    return countries
+    return ORJSONResponse(reference_cache.get(session, 'countries'))
 
 
 @app.get('/countries/{country_id}', response_model=CountryPublic, tags=[Tags.countries], summary="Get a country by id")
@@ -433,9 +689,7 @@ async def create_industry(industry: IndustryBase, session: SessionDep):
 @app.get('/industries/', response_model=list[IndustryPublic], tags=[Tags.industries], summary="Get all industries")
 async def read_industries(session: SessionDep):
     """Retrieve a paginated list of all industries. You can choose page and how many industries will be displayed in each page"""
-    industries = session.exec(select(Industry)).all()
-
-    return industries
+    return ORJSONResponse(reference_cache.get(session, 'industries'))
 
 
 @app.get('/industries/{industry_id}', response_model=IndustryPublic, tags=[Tags.industries], summary="Get an industry by id")
@@ -507,9 +761,7 @@ async def create_number_of_employees(number_of_employees: NumberOfEmployeesBase,
 @app.get('/numbers-of-employees/', response_model=list[NumberOfEmployeesPublic], tags=[Tags.number_of_employees], summary="Get all groups of number of emloyees")
 async def read_number_of_employees(session: SessionDep):
     """Retrieve a paginated list of all groups of number of employees. You can choose page and how many groups of number of employees will be displayed in each page"""
-    numbers_of_employees = session.exec(select(NumberOfEmployees)).all()
-
-    return numbers_of_employees
+    return ORJSONResponse(reference_cache.get(session, 'number_of_employees'))
 
 
 @app.get('/numbers-of-employees/{number_id}', response_model=NumberOfEmployeesPublic, tags=[Tags.number_of_employees], summary="Get a group of number of emloyees")
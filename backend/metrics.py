@@ -0,0 +1,171 @@
+"""Request and SQL metrics in the Prometheus text format.
+
+`MetricsMiddleware` times every request and counts the SQL queries it runs, using
+SQLAlchemy engine events registered by `instrument_engine`. Metrics are kept in
+memory per worker process and rendered by `render_metrics` for `/metrics`.
+Queries slower than `SLOW_QUERY_SECONDS` (environment variable, disabled when
+unset) are logged with their SQL and parameters.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from starlette.middleware.base import BaseHTTPMiddleware
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_SECONDS", 0)) or None
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram with labels."""
+
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # label values -> [bucket counts..., sum, count]
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            bucket = bisect_left(self.buckets, value)
+            if bucket < len(self.buckets):
+                series[bucket] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} histogram"]
+
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+
+        bucket_label_names = self.label_names + ("le",)
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bucket, count in zip(self.buckets, values):
+                cumulative += count
+                labels = format_labels(bucket_label_names, label_values + (bucket,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(bucket_label_names, label_values + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {values[-1]}")
+
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {values[-2]}")
+            lines.append(f"{self.name}_count{labels} {values[-1]}")
+
+        return lines
+
+
+def format_labels(names, values):
+    """Format label pairs as `{name="value",...}`, escaping the values."""
+    if not names:
+        return ""
+
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+
+    return "{" + ",".join(pairs) + "}"
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time spent handling requests.",
+    ("method", "route", "status"), LATENCY_BUCKETS)
+request_queries = Histogram(
+    "http_request_db_queries", "SQL queries run by one request.",
+    ("method", "route"), QUERY_COUNT_BUCKETS)
+request_query_duration = Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL queries by one request.",
+    ("method", "route"), LATENCY_BUCKETS)
+query_duration = Histogram(
+    "db_query_duration_seconds", "Time spent in one SQL query.",
+    (), LATENCY_BUCKETS)
+
+HISTOGRAMS = (request_duration, request_queries,
+              request_query_duration, query_duration)
+
+
+class RequestQueries:
+    """SQL queries run while handling the current request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+current_request_queries: ContextVar[RequestQueries | None] = ContextVar(
+    "current_request_queries", default=None)
+
+
+def instrument_engine(engine):
+    """Time every SQL query run through `engine`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        query_duration.observe(elapsed)
+
+        request_stats = current_request_queries.get()
+        if request_stats is not None:
+            request_stats.count += 1
+            request_stats.duration += elapsed
+
+        if SLOW_QUERY_SECONDS and elapsed >= SLOW_QUERY_SECONDS:
+            logger.warning("Slow query (%.3fs): %s %r",
+                           elapsed, " ".join(statement.split()), parameters)
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Record latency and SQL queries of every request, labelled with its route template."""
+
+    async def dispatch(self, request, call_next):
+        request_stats = RequestQueries()
+        token = current_request_queries.set(request_stats)
+        start = time.perf_counter()
+        status = 500
+
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request_queries.reset(token)
+
+            route = request.scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            request_duration.observe(elapsed, request.method, route, str(status))
+            request_queries.observe(request_stats.count, request.method, route)
+            request_query_duration.observe(
+                request_stats.duration, request.method, route)
+
+
+def render_metrics():
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+
+    return "\n".join(lines) + "\n"
@@ -1,3 +1,6 @@
+from datetime import datetime
+
+from sqlalchemy import Index, func, text
 from sqlmodel import Field, SQLModel
 
 
@@ -13,6 +16,13 @@ class AddressBase(SQLModel):
 
 class Address(AddressBase, table=True):
     __tablename__ = 'addresses'
+    __table_args__ = (
+        # Indexes behind the filters of the addresses list. Each one keeps the
+        # rows of a key in id order, the order of the list.
+        Index('ix_addresses_city_id', 'city_id'),
+        Index('ix_addresses_country_id', 'country_id'),
+        Index('ix_addresses_type', 'type'),
+    )
 
     id: int | None = Field(default=None, primary_key=True)
 
@@ -21,6 +31,11 @@ class AddressPublic(AddressBase):
     id: int
 
 
+class AddressPublicWithNames(AddressPublic):
+    city_name: str | None = None
+    country_name: str | None = None
+
+
 # Cities Models
 class CityBase(SQLModel):
     name: str
@@ -50,14 +65,48 @@ class CompanyBase(SQLModel):
 
 class Company(CompanyBase, table=True):
     __tablename__ = 'companies'
+    __table_args__ = (
+        # Indexes behind the filters and sorts of the companies list, every list
+        # query filters on has_own_image. Within one key, rows are in id order.
+        Index('ix_companies_own_image', 'has_own_image'),
+        Index('ix_companies_own_image_year', 'has_own_image', 'year_founded'),
+        Index('ix_companies_own_image_employees_year',
+              'has_own_image', 'number_of_employees_id', 'year_founded'),
+        # Lookups of the companies sharing an image by the has_own_image triggers
+        Index('ix_companies_image_id_own', 'image_id', 'has_own_image'),
+    )
 
     id: int | None = Field(default=None, primary_key=True)
+    canonical_website: str | None = Field(
+        default=None, max_length=256, unique=True, index=True)
+    # Maintained by the triggers of own_image.py, never written by the API
+    has_own_image: bool = Field(
+        default=False, sa_column_kwargs={'server_default': text('0')})
 
 
 class CompanyPublic(CompanyBase):
     id: int
 
 
+# Change feed models
+class Change(SQLModel, table=True):
+    __tablename__ = 'changes'
+    # Same table as `change_feed.CREATE_CHANGES_TABLE`, checked by tests/test_schema.py.
+    # Rows are written by triggers
+    __table_args__ = (
+        Index('ix_changes_row', 'table_name', 'row_id', unique=True),
+        {'sqlite_autoincrement': True},
+    )
+
+    seq: int | None = Field(default=None, primary_key=True)
+    table_name: str
+    row_id: int
+    deleted: bool = Field(
+        default=False, sa_column_kwargs={'server_default': text('0')})
+    changed_at: datetime | None = Field(
+        default=None, nullable=False, sa_column_kwargs={'server_default': func.current_timestamp()})
+
+
 # Company Images models
 class CompanyImageBase(SQLModel):
     company_id: int = Field(foreign_key='companies.id')
@@ -90,6 +139,37 @@ class CountryPublic(CountryBase):
     id: int
 
 
+# Favicon jobs models
+class FaviconJobBase(SQLModel):
+    company_id: int = Field(unique=True)
+    status: str = Field(
+        default='queued', sa_column_kwargs={'server_default': 'queued'})
+    attempts: int = Field(
+        default=0, sa_column_kwargs={'server_default': text('0')})
+    last_error: str | None = None
+    run_after: datetime | None = Field(
+        default=None, nullable=False, sa_column_kwargs={'server_default': func.current_timestamp()})
+    updated_at: datetime | None = Field(
+        default=None, nullable=False, sa_column_kwargs={'server_default': func.current_timestamp()})
+    # Enqueued again while running, queued again when the attempt finishes
+    requeue: bool = Field(
+        default=False, sa_column_kwargs={'server_default': text('0')})
+
+
+class FaviconJob(FaviconJobBase, table=True):
+    __tablename__ = 'favicon_jobs'
+    # Same table as `favicon_queue.CREATE_FAVICON_JOBS_TABLE`, checked by tests/test_schema.py
+    __table_args__ = (
+        Index('ix_favicon_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+
+
+class FaviconJobPublic(FaviconJobBase):
+    id: int
+
+
 # Industries models
 class IndustryBase(SQLModel):
     name: str
@@ -0,0 +1,91 @@
+"""Materialized `companies.has_own_image` flag.
+
+A company has its own image when its `image_id` is set and no other company uses
+the same image: a logo shared with other companies is a generic placeholder. The
+companies list filters on this for every page, so it is kept as a column,
+maintained by SQLite triggers for every writer (API, scraper, maintenance
+scripts), and the list filters and counts on indexes that start with it instead
+of probing the other companies of every row.
+
+Every trigger only looks at the companies of the old and new image, and stops
+after two of them, so shared placeholders used by many companies stay cheap.
+"""
+
+# Created by `own_image_statements`, checked by `database.check_schema`
+OWN_IMAGE_TRIGGERS = (
+    "companies_insert_own_image",
+    "companies_update_own_image",
+    "companies_delete_own_image",
+)
+
+# 1 if company `row` keeps an image no other company uses
+OWN_IMAGE = """
+    ({row}.image_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM companies AS other
+        WHERE other.image_id = {row}.image_id AND other.id != {row}.id
+    ))
+"""
+
+# The image `image` got one more company: its previous single owner loses it
+TAKE_IMAGE = """
+    UPDATE companies SET has_own_image = 0
+    WHERE image_id = {image} AND has_own_image = 1 AND id != NEW.id;
+"""
+
+# The image `image` lost a company: a single remaining company now owns it
+LEAVE_IMAGE = """
+    UPDATE companies SET has_own_image = 1
+    WHERE image_id = {image} AND (
+        SELECT count(*) FROM (SELECT 1 FROM companies WHERE image_id = {image} LIMIT 2)
+    ) = 1;
+"""
+
+
+def own_image_statements():
+    """Return the SQL statements that create the triggers maintaining `has_own_image`."""
+    set_new_flag = f"UPDATE companies SET has_own_image = {OWN_IMAGE.format(row='NEW')} WHERE id = NEW.id;"
+
+    return [
+        f"""
+            CREATE TRIGGER IF NOT EXISTS companies_insert_own_image
+            AFTER INSERT ON companies
+            BEGIN
+                {set_new_flag}
+                {TAKE_IMAGE.format(image='NEW.image_id')}
+            END
+        """,
+        f"""
+            CREATE TRIGGER IF NOT EXISTS companies_update_own_image
+            AFTER UPDATE OF image_id ON companies
+            WHEN OLD.image_id IS NOT NEW.image_id
+            BEGIN
+                {LEAVE_IMAGE.format(image='OLD.image_id')}
+                {set_new_flag}
+                {TAKE_IMAGE.format(image='NEW.image_id')}
+            END
+        """,
+        f"""
+            CREATE TRIGGER IF NOT EXISTS companies_delete_own_image
+            AFTER DELETE ON companies
+            BEGIN
+                {LEAVE_IMAGE.format(image='OLD.image_id')}
+            END
+        """,
+    ]
+
+
+def create_own_image_flag(execute):
+    """Create the triggers with `execute`, a function running one SQL statement.
+
+    The `has_own_image` column must already exist. The flag of every company is
+    computed once when the triggers are created.
+    """
+    new_triggers = execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'companies_insert_own_image'").fetchone() is None
+
+    for statement in own_image_statements():
+        execute(statement)
+
+    if new_triggers:
+        execute(
+            f"UPDATE companies SET has_own_image = {OWN_IMAGE.format(row='companies')}")
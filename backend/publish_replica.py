@@ -0,0 +1,52 @@
+"""Publish a read-only snapshot of the writer database for read replica mode.
+
+The snapshot is copied with the SQLite online backup API, so the writer (API or
+scraper) keeps working meanwhile, then moved over the published file with an
+atomic rename. API workers started with READ_REPLICA_PATH pointing to the published
+file open it immutable and switch to the new snapshot on their next connection.
+
+Usage: python publish_replica.py --source companies.db --target replica/companies.db
+"""
+import argparse
+import os
+import sqlite3
+
+
+def publish_replica(source_path, target_path):
+    """Copy `source_path` into a new snapshot and atomically replace `target_path` with it."""
+    target_dir = os.path.dirname(os.path.abspath(target_path))
+    os.makedirs(target_dir, exist_ok=True)
+    temporary_path = f"{target_path}.{os.getpid()}.tmp"
+
+    try:
+        source = sqlite3.connect(source_path)
+        snapshot = sqlite3.connect(temporary_path)
+        source.backup(snapshot)
+        source.close()
+
+        # Immutable readers must not depend on -wal or -journal files
+        snapshot.execute("PRAGMA journal_mode = DELETE")
+        snapshot.execute("ANALYZE")
+        snapshot.commit()
+        snapshot.close()
+
+        with open(temporary_path, "rb") as snapshot_file:
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary_path, target_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default="companies.db")
+    parser.add_argument("--target", default="replica/companies.db")
+    args = parser.parse_args()
+
+    publish_replica(args.source, args.target)
+    print(f"Published {args.source} as read replica {args.target}.")
+
+
+if __name__ == "__main__":
+    main()
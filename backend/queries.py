@@ -0,0 +1,81 @@
+from enum import Enum
+
+from sqlmodel import and_, not_, or_, select
+
+from models import Address, Company
+
+
+class CompanySort(Enum):
+    id = 'id'
+    id_desc = '-id'
+    year_founded = 'year_founded'
+    year_founded_desc = '-year_founded'
+
+
+# Sorts are backed by indexes, id breaks ties so pages stay stable
+COMPANY_SORTS = {
+    CompanySort.id: (Company.id,),
+    CompanySort.id_desc: (Company.id.desc(),),
+    CompanySort.year_founded: (Company.year_founded, Company.id),
+    CompanySort.year_founded_desc: (Company.year_founded.desc(), Company.id.desc()),
+}
+
+
+def companies_list_query(
+    columns,
+    number_of_employees_id=None,
+    year_founded_from=None,
+    year_founded_to=None,
+    has_social_link=None,
+    has_image=True,
+    sort=CompanySort.id,
+):
+    """Select `columns` of the companies matching the filters of the companies list.
+
+    Every query filters on the materialized `has_own_image` flag first, so it
+    searches one of the indexes starting with it (see `Company.__table_args__`).
+    """
+    companies_query = select(*columns).select_from(Company).where(
+        Company.has_own_image == has_image)
+
+    if number_of_employees_id is not None:
+        companies_query = companies_query.where(
+            Company.number_of_employees_id == number_of_employees_id)
+
+    if year_founded_from is not None or year_founded_to is not None:
+        # Years are stored as 4 digit strings, "" when unknown
+        companies_query = companies_query.where(Company.year_founded != '')
+        if year_founded_from is not None:
+            companies_query = companies_query.where(
+                Company.year_founded >= f"{year_founded_from:04d}")
+        if year_founded_to is not None:
+            companies_query = companies_query.where(
+                Company.year_founded <= f"{year_founded_to:04d}")
+
+    if has_social_link is not None:
+        social_link = or_(*(
+            and_(link.is_not(None), link != '')
+            for link in (Company.linkedin, Company.facebook, Company.twitter)
+        ))
+        companies_query = companies_query.where(
+            social_link if has_social_link else not_(social_link))
+
+    return companies_query.order_by(*COMPANY_SORTS[sort])
+
+
+def addresses_list_query(columns, city_id=None, country_id=None, type=None):
+    """Select `columns` of the addresses matching the filters of the addresses list.
+
+    Every filter has its own index, when several are given SQLite searches the
+    most selective one according to `ANALYZE`.
+    """
+    addresses_query = select(*columns).select_from(Address)
+
+    if city_id is not None:
+        addresses_query = addresses_query.where(Address.city_id == city_id)
+    if country_id is not None:
+        addresses_query = addresses_query.where(Address.country_id == country_id)
+    if type is not None:
+        addresses_query = addresses_query.where(Address.type == type)
+
+    return addresses_query.order_by(Address.id)
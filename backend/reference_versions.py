@@ -0,0 +1,53 @@
+"""Version counters of the small reference tables cached by the API.
+
+Every insert, update and delete of a versioned table bumps its row in the
+`reference_versions` table, through SQLite triggers, so the API keeps serving
+its cached rows until that table itself changes, whoever changed it. Writes to
+companies and the other large tables do not touch the counters.
+"""
+
+VERSIONED_TABLES = ("countries", "industries", "number_of_employees")
+VERSIONED_EVENTS = ("INSERT", "UPDATE", "DELETE")
+# Created by `reference_versions_statements`, checked by `database.check_schema`
+REFERENCE_VERSION_TRIGGERS = tuple(
+    f"{table_name}_{event.lower()}_version" for table_name in VERSIONED_TABLES for event in VERSIONED_EVENTS)
+
+CREATE_REFERENCE_VERSIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS reference_versions (
+        table_name VARCHAR PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+
+def reference_versions_statements():
+    """Return the SQL statements that create the `reference_versions` table and its triggers."""
+    statements = [CREATE_REFERENCE_VERSIONS_TABLE]
+
+    for table_name in VERSIONED_TABLES:
+        statements.append(f"""
+            INSERT OR IGNORE INTO reference_versions (table_name) VALUES ('{table_name}')
+        """)
+        for event in VERSIONED_EVENTS:
+            statements.append(f"""
+                CREATE TRIGGER IF NOT EXISTS {table_name}_{event.lower()}_version
+                AFTER {event} ON {table_name}
+                BEGIN
+                    UPDATE reference_versions SET version = version + 1
+                    WHERE table_name = '{table_name}';
+                END
+            """)
+
+    return statements
+
+
+def create_reference_versions(execute):
+    """Create the version counters with `execute`, a function running one SQL statement."""
+    for statement in reference_versions_statements():
+        execute(statement)
+
+
+def reference_version(execute, table_name):
+    """Return the current version of a versioned table."""
+    return execute(
+        "SELECT version FROM reference_versions WHERE table_name = ?", (table_name,)).fetchone()[0]
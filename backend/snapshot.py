@@ -0,0 +1,129 @@
+"""Versioned snapshot of the company directory for the static site build.
+
+The Astro build reads one snapshot instead of requesting every page of companies
+and every company image from the API. Companies are stored as compact rows (see
+`SNAPSHOT_FIELDS`) chunked into pages of `page_size`, and `version` is a hash of
+the content, so the build only has to run again when the version changes.
+
+Usage: python snapshot.py --output ../frontend/src/data/snapshot.json --page-size 9
+"""
+import argparse
+import hashlib
+import os
+
+import orjson
+from sqlmodel import Session, func, select
+
+from database import engine
+from models import Company, CompanyImage
+
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_FIELDS = ("id", "website", "year_founded", "about", "image_url")
+# CompanyList shows only the beginning of "about"
+SNAPSHOT_ABOUT_MAX_LEN = 150
+
+
+def build_snapshot(session: Session, page_size=9):
+    """Build the snapshot of all listed companies, in the order of the companies list."""
+    companies_query = (
+        select(
+            Company.id,
+            Company.website,
+            Company.year_founded,
+            func.substr(Company.about, 1, SNAPSHOT_ABOUT_MAX_LEN),
+            CompanyImage.image_url,
+        )
+        .join(CompanyImage, CompanyImage.id == Company.image_id)
+        .where(Company.has_own_image)
+        .order_by(Company.id)
+    )
+    rows = [list(row) for row in session.connection().execute(companies_query)]
+    pages = [rows[start:start + page_size]
+             for start in range(0, len(rows), page_size)]
+
+    snapshot = {
+        "format": SNAPSHOT_FORMAT,
+        "fields": SNAPSHOT_FIELDS,
+        "page_size": page_size,
+        "total": len(rows),
+        "pages": pages,
+    }
+    snapshot["version"] = hashlib.sha256(orjson.dumps(snapshot)).hexdigest()[:16]
+
+    return snapshot
+
+
+def latest_change(session: Session):
+    """Return the `seq` of the latest change to companies or company images.
+
+    The snapshot only reads these tables, so it is the same as long as this is.
+    """
+    return session.connection().exec_driver_sql("SELECT MAX(seq) FROM changes").scalar()
+
+
+class SnapshotCache:
+    """The last serialized snapshot, built again after a change.
+
+    Building and hashing the snapshot reads every listed company, so the API keeps
+    the last one and only compares the latest change of the change feed. Only one
+    snapshot is kept, the static site build always asks for the same page size.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.version = None
+        self.body = None
+
+    def get(self, session: Session, page_size=9):
+        """Return the version and JSON body of the current snapshot."""
+        key = (page_size, latest_change(session))
+        if key != self.key:
+            snapshot = build_snapshot(session, page_size)
+            self.key, self.version, self.body = key, snapshot["version"], orjson.dumps(snapshot)
+
+        return self.version, self.body
+
+
+snapshot_cache = SnapshotCache()
+
+
+def write_snapshot(snapshot, output_path):
+    """Write the snapshot to `output_path` unless the file already has this version.
+
+    The file is replaced atomically. Returns True when the file was written.
+    """
+    try:
+        with open(output_path, "rb") as snapshot_file:
+            if orjson.loads(snapshot_file.read()).get("version") == snapshot["version"]:
+                return False
+    except (OSError, orjson.JSONDecodeError):
+        pass
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    temporary_path = f"{output_path}.tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        snapshot_file.write(orjson.dumps(snapshot))
+    os.replace(temporary_path, output_path)
+
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--output", default="../frontend/src/data/snapshot.json")
+    parser.add_argument("--page-size", type=int, default=9)
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        snapshot = build_snapshot(session, args.page_size)
+
+    if write_snapshot(snapshot, args.output):
+        print(f"Snapshot {snapshot['version']} with {snapshot['total']} companies written to {args.output}.")
+    else:
+        print(f"Snapshot {snapshot['version']} is up to date, nothing to rebuild.")
+
+
+if __name__ == "__main__":
+    main()
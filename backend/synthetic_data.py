@@ -0,0 +1,225 @@
+"""Fill a database with synthetic companies for benchmarks.
+
+Generates reference rows (countries, cities, industries, groups of number of
+employees), addresses, companies and company images with the same shapes as the
+scraped data: most companies have their own favicon and the others share a
+generic one. The same `--seed` always produces the same database, so
+benchmark results of different commits can be compared.
+
+Usage: python synthetic_data.py --companies 100000 --output bench.db
+(10000, 100000 and 1000000 companies are the usual volumes)
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+from sqlmodel import SQLModel, create_engine
+
+from change_feed import create_change_feed
+from own_image import create_own_image_flag
+from reference_versions import create_reference_versions
+from models import *  # Registers all tables in SQLModel.metadata
+
+
+BATCH_SIZE = 10000
+
+COUNTRIES = (
+    "Argentina", "Australia", "Austria", "Belgium", "Brazil", "Canada", "Chile", "China",
+    "Colombia", "Czech Republic", "Denmark", "Egypt", "Finland", "France", "Germany",
+    "Greece", "India", "Indonesia", "Ireland", "Israel", "Italy", "Japan", "Kenya",
+    "Mexico", "Netherlands", "New Zealand", "Nigeria", "Norway", "Peru", "Poland",
+    "Portugal", "Romania", "Singapore", "South Africa", "South Korea", "Spain", "Sweden",
+    "Switzerland", "Turkey", "Ukraine", "United Kingdom", "United States", "Uruguay",
+    "Vietnam",
+)
+CITIES_PER_COUNTRY = 12
+INDUSTRIES = (
+    "Accounting", "Advertising", "Aerospace", "Agriculture", "Automotive", "Banking",
+    "Biotechnology", "Construction", "Consulting", "Cybersecurity", "E-commerce",
+    "Education", "Energy", "Entertainment", "Financial Services", "Food & Beverages",
+    "Government", "Healthcare", "Hospitality", "Insurance", "Internet", "Legal Services",
+    "Logistics", "Manufacturing", "Media", "Mining", "Non-profit", "Pharmaceuticals",
+    "Real Estate", "Retail", "Semiconductors", "Software", "Telecommunications", "Travel",
+)
+NUMBER_OF_EMPLOYEES = (
+    "1-10", "11-50", "51-200", "201-500", "501-1000", "1001-5000", "5001-10000", "10001+",
+)
+# Small companies are the most common, weights match NUMBER_OF_EMPLOYEES
+NUMBER_OF_EMPLOYEES_WEIGHTS = (30, 28, 18, 9, 6, 5, 2, 2)
+ADDRESS_TYPES = ("headquarters", "office", "warehouse", "factory")
+
+WORDS = (
+    "apex", "blue", "bright", "cloud", "core", "data", "delta", "edge", "first", "flow",
+    "forge", "global", "green", "grid", "harbor", "hive", "iron", "logic", "lumen", "metro",
+    "nexus", "north", "nova", "orbit", "peak", "pixel", "prime", "quantum", "rapid", "river",
+    "sage", "signal", "solid", "spark", "stone", "summit", "swift", "terra", "true", "vector",
+)
+ABOUT_SENTENCES = (
+    "We build software that helps teams ship faster.",
+    "Our platform connects suppliers and retailers across the region.",
+    "Founded by engineers, we care about reliable infrastructure.",
+    "We provide consulting services to small and medium businesses.",
+    "Our mission is to make data accessible to everyone.",
+    "We design and manufacture components for industrial customers.",
+    "Customers in more than thirty countries trust our products.",
+    "We are hiring across engineering, sales and support.",
+)
+
+# Share of companies with their own favicon, the others share a generic one
+OWN_IMAGE_SHARE = 0.85
+
+
+def insert_batches(conn, statement, rows):
+    """Insert the rows produced by the iterable `rows` in batches of `BATCH_SIZE`."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            conn.executemany(statement, batch)
+            batch.clear()
+
+    if batch:
+        conn.executemany(statement, batch)
+
+
+def company_name(rng):
+    return "-".join(rng.sample(WORDS, 2))
+
+
+def company_rows(rng, companies, shared_image_id):
+    """Yield (companies row, company_images row or None) for every company."""
+    for company_id in range(1, companies + 1):
+        slug = f"{company_name(rng)}-{company_id}"
+        website = f"https://www.{slug}.example.com/"
+        about = " ".join(rng.choices(ABOUT_SENTENCES, k=rng.randint(1, 6)))
+        year_founded = str(rng.randint(1900, 2024)) if rng.random() < 0.9 else ""
+
+        image = None
+        if rng.random() < OWN_IMAGE_SHARE:
+            # Company ids and image ids of own favicons are kept equal, the
+            # shared favicon comes after all of them
+            image_id = company_id
+            image = (image_id, company_id,
+                     f"https://storage.example.com/companies-images/{company_id}.png",
+                     f"{rng.getrandbits(256):064x}")
+        else:
+            image_id = shared_image_id
+
+        company = (
+            company_id, about, year_founded, website,
+            rng.choices(range(1, len(NUMBER_OF_EMPLOYEES) + 1),
+                        NUMBER_OF_EMPLOYEES_WEIGHTS)[0],
+            f"https://www.linkedin.com/company/{slug}" if rng.random() < 0.7 else None,
+            f"https://www.facebook.com/{slug}" if rng.random() < 0.4 else None,
+            f"https://twitter.com/{slug}" if rng.random() < 0.5 else "",
+            image_id,
+            f"{slug}.example.com",
+        )
+        yield company, image
+
+
+def generate(db_path, companies, seed=0):
+    """Create `db_path` and fill it with `companies` synthetic companies and related rows."""
+    rng = random.Random(seed)
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(db_path)
+    # The file is thrown away if generation fails, durability is not needed
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    conn.executemany("INSERT INTO countries (id, name) VALUES (?, ?)",
+                     enumerate(COUNTRIES, start=1))
+    cities = [
+        (len(COUNTRIES) * i + country_id, f"{country} City {i + 1}")
+        for country_id, country in enumerate(COUNTRIES, start=1)
+        for i in range(CITIES_PER_COUNTRY)
+    ]
+    conn.executemany("INSERT INTO cities (id, name) VALUES (?, ?)", cities)
+    conn.executemany("INSERT INTO industries (id, name) VALUES (?, ?)",
+                     enumerate(INDUSTRIES, start=1))
+    conn.executemany("INSERT INTO number_of_employees (id, name) VALUES (?, ?)",
+                     enumerate(NUMBER_OF_EMPLOYEES, start=1))
+
+    insert_batches(conn, """
+        INSERT INTO addresses (street, city_id, state, postal_code, country_id, type)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (
+        (f"{rng.randint(1, 9999)} {rng.choice(WORDS).title()} Street",
+         city_id, "", f"{rng.randint(10000, 99999)}",
+         (city_id - 1) % len(COUNTRIES) + 1, rng.choice(ADDRESS_TYPES))
+        for city_id in (rng.randint(1, len(cities)) for _ in range(companies))
+    ))
+
+    shared_image_id = companies + 1
+    company_batch, image_batch = [], []
+
+    def flush():
+        conn.executemany("""
+            INSERT INTO companies (id, about, year_founded, website, number_of_employees_id,
+                                   linkedin, facebook, twitter, image_id, canonical_website)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, company_batch)
+        conn.executemany("""
+            INSERT INTO company_images (id, company_id, image_url, image_hash)
+            VALUES (?, ?, ?, ?)
+        """, image_batch)
+        company_batch.clear()
+        image_batch.clear()
+
+    for company, image in company_rows(rng, companies, shared_image_id):
+        company_batch.append(company)
+        if image:
+            image_batch.append(image)
+        if len(company_batch) == BATCH_SIZE:
+            flush()
+
+    image_batch.append((shared_image_id, 1,
+                        "https://storage.example.com/companies-images/default.png",
+                        f"{rng.getrandbits(256):064x}"))
+    flush()
+
+    # Created after the bulk load, the flag is computed and every row is
+    # recorded once in the feed
+    create_own_image_flag(conn.execute)
+    create_change_feed(conn.execute)
+    create_reference_versions(conn.execute)
+    conn.commit()
+
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--companies", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench.db")
+    parser.add_argument("--force", action="store_true",
+                        help="overwrite the output file if it exists")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        if not args.force:
+            parser.error(f"{args.output} exists, use --force to overwrite it")
+        os.remove(args.output)
+
+    start = time.perf_counter()
+    try:
+        generate(args.output, args.companies, args.seed)
+    except BaseException:
+        os.remove(args.output)
+        raise
+
+    print(f"Generated {args.companies} companies in {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The backend modules import each other as top level modules, the scripts at the
+# root of the project import them from the `backend` directory
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(1, os.path.dirname(BACKEND_DIR))
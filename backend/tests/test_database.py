@@ -0,0 +1,34 @@
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+import database
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'companies.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "read_replica_path", None)
+    yield engine
+    engine.dispose()
+
+
+def test_check_schema_reports_missing_raw_sql_objects(engine):
+    SQLModel.metadata.create_all(engine)
+
+    with pytest.raises(RuntimeError) as error:
+        database.check_schema()
+
+    message = str(error.value)
+    for name in ("table reference_versions", "trigger companies_insert_own_image",
+                 "trigger companies_update_change", "trigger countries_insert_version"):
+        assert name in message
+    assert "python database.py" in message
+
+
+def test_check_schema_after_migration(engine):
+    database.create_db_and_tables()
+    # Running it again finds nothing left to do
+    database.create_db_and_tables()
+
+    database.check_schema()
@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+from db_functions import insert_companies, merge_duplicate_websites
+from synthetic_data import generate
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    # Every table and trigger of a migrated database, without companies
+    db_path = str(tmp_path / "companies.db")
+    generate(db_path, 0)
+    with sqlite3.connect(db_path) as connection:
+        connection.executemany(
+            "INSERT INTO company_images (id, company_id, image_url, image_hash) VALUES (?, ?, ?, ?)",
+            [(image_id, image_id, f"https://blob/{image_id}.png", f"hash-{image_id}") for image_id in (2, 3)])
+    return db_path
+
+
+def company(website, **columns):
+    return {"about": "About", "year_founded": "2001", "website": website,
+            "number_of_employees_id": 1, "image_id": 1, **columns}
+
+
+def websites(db_path):
+    with sqlite3.connect(db_path) as connection:
+        return connection.execute(
+            "SELECT website, canonical_website FROM companies ORDER BY id").fetchall()
+
+
+def test_insert_companies_counts_inserted_rows(db_path):
+    assert insert_companies(db_path, [company("https://x.com")]) == 1
+    assert insert_companies(db_path, [
+        company("http://www.x.com/"),
+        company("X.com"),
+        company("https://y.com"),
+        company("y.com/"),
+    ]) == 1
+
+    assert websites(db_path) == [("https://x.com", "x.com"), ("https://y.com", "y.com")]
+
+
+def test_merge_duplicate_websites(db_path):
+    with sqlite3.connect(db_path) as connection:
+        connection.executemany("""
+            INSERT INTO companies (id, about, year_founded, website, number_of_employees_id, image_id, linkedin, twitter)
+            VALUES (?, 'About', '2001', ?, 1, ?, ?, ?)
+        """, [
+            (1, "https://x.com", 2, None, "https://twitter.com/x"),
+            (2, "http://www.x.com/", 3, "https://linkedin.com/x", "https://twitter.com/other"),
+            (3, "https://y.com", 1, None, None),
+            (4, "X.COM", 1, None, None),
+        ])
+        connection.execute("UPDATE company_images SET company_id = 2 WHERE id = 3")
+
+    assert merge_duplicate_websites(db_path) == 2
+
+    with sqlite3.connect(db_path) as connection:
+        survivor = connection.execute(
+            "SELECT id, image_id, linkedin, twitter, canonical_website FROM companies WHERE id = 1").fetchone()
+        images = connection.execute(
+            "SELECT id, company_id FROM company_images WHERE id = 3").fetchone()
+    # The survivor keeps its own values and takes over the links it missed
+    assert survivor == (1, 2, "https://linkedin.com/x", "https://twitter.com/x", "x.com")
+    assert images == (3, 1)
+    assert websites(db_path) == [("https://x.com", "x.com"), ("https://y.com", "y.com")]
+
+    # Running it again finds nothing left to merge
+    assert merge_duplicate_websites(db_path) == 0
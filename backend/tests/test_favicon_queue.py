@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+from favicon_queue import (claim_favicon_job, create_favicon_queue, enqueue_favicon_job,
+                           finish_favicon_job, requeue_stale_favicon_jobs)
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    create_favicon_queue(connection.execute)
+    yield connection
+    connection.close()
+
+
+def job_state(connection, job_id):
+    return connection.execute(
+        "SELECT status, attempts, requeue FROM favicon_jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_enqueue_twice_queues_once(connection):
+    job_id = enqueue_favicon_job(connection.execute, 1)
+
+    assert enqueue_favicon_job(connection.execute, 1) == job_id
+    assert claim_favicon_job(connection.execute) == (job_id, 1)
+    assert claim_favicon_job(connection.execute) is None
+
+
+def test_enqueue_running_job_is_not_claimed_twice(connection):
+    job_id = enqueue_favicon_job(connection.execute, 1)
+    claim_favicon_job(connection.execute)
+
+    assert enqueue_favicon_job(connection.execute, 1) == job_id
+    assert job_state(connection, job_id) == ("running", 1, 1)
+    # A second worker must not run the same company while the first one does
+    assert claim_favicon_job(connection.execute) is None
+
+
+@pytest.mark.parametrize("error", [None, "No favicon stored"])
+def test_finish_requeued_job_queues_it_again(connection, error):
+    job_id = enqueue_favicon_job(connection.execute, 1)
+    claim_favicon_job(connection.execute)
+    enqueue_favicon_job(connection.execute, 1)
+
+    finish_favicon_job(connection.execute, job_id, error=error)
+
+    assert job_state(connection, job_id) == ("queued", 0, 0)
+    assert claim_favicon_job(connection.execute) == (job_id, 1)
+
+
+def test_finish_job_without_requeue(connection):
+    job_id = enqueue_favicon_job(connection.execute, 1)
+    claim_favicon_job(connection.execute)
+
+    finish_favicon_job(connection.execute, job_id)
+
+    assert job_state(connection, job_id) == ("done", 1, 0)
+    # Enqueueing a finished job queues it again
+    enqueue_favicon_job(connection.execute, 1)
+    assert job_state(connection, job_id) == ("queued", 0, 0)
+
+
+def test_stale_requeued_job_is_queued_once(connection):
+    job_id = enqueue_favicon_job(connection.execute, 1)
+    claim_favicon_job(connection.execute)
+    enqueue_favicon_job(connection.execute, 1)
+
+    requeue_stale_favicon_jobs(connection.execute)
+
+    assert job_state(connection, job_id) == ("queued", 1, 0)
+
+
+def test_create_adds_requeue_to_existing_table():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("""
+        CREATE TABLE favicon_jobs (
+            id INTEGER PRIMARY KEY,
+            company_id INTEGER NOT NULL UNIQUE,
+            status VARCHAR NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error VARCHAR,
+            run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    connection.execute("INSERT INTO favicon_jobs (company_id) VALUES (1)")
+
+    create_favicon_queue(connection.execute)
+
+    assert connection.execute("SELECT requeue FROM favicon_jobs").fetchall() == [(0,)]
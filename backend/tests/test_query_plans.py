@@ -0,0 +1,93 @@
+"""Query plans of the list endpoints, checked with EXPLAIN QUERY PLAN.
+
+Runs every combination of filters and sorts against a small synthetic database,
+so a change to the queries or the indexes that makes SQLite scan a table or sort
+every matching row fails here instead of in production.
+"""
+import itertools
+import sqlite3
+
+import pytest
+from sqlalchemy.dialects import sqlite
+from sqlmodel import func, select
+
+from models import Address, Company
+from queries import CompanySort, addresses_list_query, companies_list_query
+from synthetic_data import generate
+
+
+@pytest.fixture(scope="module")
+def connection(tmp_path_factory):
+    db_path = tmp_path_factory.mktemp("plans") / "plans.db"
+    generate(str(db_path), 2000)
+    connection = sqlite3.connect(db_path)
+    yield connection
+    connection.close()
+
+
+def query_plan(connection, statement):
+    sql = str(statement.compile(dialect=sqlite.dialect(),
+              compile_kwargs={"literal_binds": True}))
+    return [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def assert_searches_companies(plan):
+    companies_steps = [step for step in plan if " companies " in f"{step} "]
+    assert companies_steps, plan
+    for step in companies_steps:
+        assert step.startswith("SEARCH companies USING"), plan
+        assert "INDEX ix_companies_own_image" in step, plan
+
+
+FILTERS = list(itertools.product(
+    (None, 3),             # number_of_employees_id
+    (None, (1990, 2010)),  # year_founded_from, year_founded_to
+    (None, True, False),   # has_social_link
+    (True, False),         # has_image
+))
+
+
+@pytest.mark.parametrize("sort", list(CompanySort))
+@pytest.mark.parametrize("employees,years,social_link,has_image", FILTERS)
+def test_companies_list_page(connection, employees, years, social_link, has_image, sort):
+    year_from, year_to = years or (None, None)
+    statement = companies_list_query(
+        [Company.id, Company.website, Company.image_id],
+        employees, year_from, year_to, social_link, has_image, sort)
+    plan = query_plan(connection, statement.limit(9).offset(90))
+
+    assert_searches_companies(plan)
+    # Only a filter on an index column before year_founded makes SQLite sort by id
+    sorted_by_index = sort in (CompanySort.year_founded, CompanySort.year_founded_desc) or (
+        employees is None and years is None)
+    if sorted_by_index:
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("employees,years,social_link,has_image", FILTERS)
+def test_companies_list_count(connection, employees, years, social_link, has_image):
+    year_from, year_to = years or (None, None)
+    statement = companies_list_query(
+        [Company.id], employees, year_from, year_to, social_link, has_image)
+    # Same count query as paginated_response
+    plan = query_plan(connection, select(func.count()).select_from(
+        statement.order_by(None).subquery()))
+
+    assert_searches_companies(plan)
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("city_id,country_id,type", list(itertools.product(
+    (None, 5), (None, 5), (None, "office"))))
+def test_addresses_list(connection, city_id, country_id, type):
+    statement = addresses_list_query([Address.id, Address.street], city_id, country_id, type)
+    plans = (
+        query_plan(connection, statement.limit(50)),
+        query_plan(connection, select(func.count()).select_from(
+            statement.order_by(None).subquery())),
+    )
+
+    for plan in plans:
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+        if city_id is not None or country_id is not None or type is not None:
+            assert all(step.startswith("SEARCH addresses USING") for step in plan), plan
@@ -0,0 +1,47 @@
+import sqlite3
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from reference_versions import create_reference_versions, reference_version
+from warmup import ReferenceCache
+
+
+def test_only_the_written_table_changes_version():
+    connection = sqlite3.connect(":memory:")
+    for table_name in ("countries", "industries", "number_of_employees"):
+        connection.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, name VARCHAR)")
+    create_reference_versions(connection.execute)
+    # Running it again keeps the counters
+    connection.execute("INSERT INTO countries (name) VALUES ('Peru')")
+    create_reference_versions(connection.execute)
+
+    connection.execute("UPDATE countries SET name = 'Chile'")
+    connection.execute("DELETE FROM countries")
+
+    assert reference_version(connection.execute, "countries") == 3
+    assert reference_version(connection.execute, "industries") == 0
+
+
+def test_cache_reloads_after_a_write_to_its_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'reference.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        create_reference_versions(connection.exec_driver_sql)
+        connection.exec_driver_sql("INSERT INTO countries (id, name) VALUES (1, 'Peru')")
+
+    cache = ReferenceCache()
+    with Session(engine) as session:
+        assert cache.get(session, "countries") == [{"name": "Peru", "id": 1}]
+        cached = cache.get(session, "countries")
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO industries (id, name) VALUES (1, 'Energy')")
+    with Session(engine) as session:
+        assert cache.get(session, "countries") is cached
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql("UPDATE countries SET name = 'Chile'")
+    with Session(engine) as session:
+        assert cache.get(session, "countries") == [{"name": "Chile", "id": 1}]
+
+    engine.dispose()
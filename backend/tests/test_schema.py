@@ -0,0 +1,55 @@
+"""Tables created with raw SQL by scripts that do not use SQLModel.
+
+`changes` is also created by the scraper and `favicon_jobs` by the favicon
+worker, which only use `sqlite3`. The raw SQL
+is the definition of the table, the model must create exactly the same table so
+a database works the same whichever process created it.
+"""
+import sqlite3
+
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from change_feed import CREATE_CHANGES_INDEX, CREATE_CHANGES_TABLE
+from favicon_queue import CREATE_FAVICON_JOBS_INDEX, CREATE_FAVICON_JOBS_TABLE
+from models import Change, FaviconJob
+
+
+def table_schema(connection, table_name):
+    """Return the columns and indexes of a table, as SQLite reports them."""
+    # An INTEGER PRIMARY KEY is never NULL, whether or not it is declared NOT NULL.
+    # Models declare `id` after the columns of their base class, the order is ignored
+    columns = sorted(
+        (name, type, notnull or pk, default, pk)
+        for _, name, type, notnull, default, pk in connection.execute(f"PRAGMA table_info({table_name})")
+    )
+    indexes = {
+        name: (unique, [column[2] for column in connection.execute(f"PRAGMA index_info({name})")])
+        for _, name, unique, origin, _ in connection.execute(f"PRAGMA index_list({table_name})")
+    }
+    return columns, indexes
+
+
+def model_schema(tmp_path, model):
+    db_path = tmp_path / "model.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine, tables=[model.__table__])
+    engine.dispose()
+
+    with sqlite3.connect(db_path) as connection:
+        return table_schema(connection, model.__tablename__)
+
+
+def raw_schema(statements, table_name):
+    with sqlite3.connect(":memory:") as connection:
+        for statement in statements:
+            connection.execute(statement)
+        return table_schema(connection, table_name)
+
+
+@pytest.mark.parametrize("model,statements", [
+    (Change, (CREATE_CHANGES_TABLE, CREATE_CHANGES_INDEX)),
+    (FaviconJob, (CREATE_FAVICON_JOBS_TABLE, CREATE_FAVICON_JOBS_INDEX)),
+])
+def test_model_matches_raw_table(tmp_path, model, statements):
+    assert model_schema(tmp_path, model) == raw_schema(statements, model.__tablename__)
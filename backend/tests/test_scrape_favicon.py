@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+import scrape_favicon
+from scrape_favicon import calculate_image_hash, initialize_database, store_favicon
+
+
+FAVICON = b"\x89PNG favicon shared by two companies"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = str(tmp_path / "scraper.db")
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("CREATE TABLE companies (id INTEGER PRIMARY KEY, website TEXT NOT NULL)")
+        connection.executemany("INSERT INTO companies (id, website) VALUES (?, ?)",
+                               [(1, "https://one.example"), (2, "https://two.example")])
+    initialize_database(db_path)
+    return db_path
+
+
+def test_store_favicon_reuses_image_stored_during_upload(db_path, monkeypatch):
+    def upload_while_another_worker_stores_it(favicon_data, company_id):
+        # The other worker commits the same image between the lookup and the insert
+        with sqlite3.connect(db_path) as other:
+            other.execute(
+                "INSERT INTO company_images (company_id, image_url, image_hash) VALUES (2, 'https://blob/2.png', ?)",
+                (calculate_image_hash(favicon_data),))
+        return f"https://blob/{company_id}.png"
+
+    monkeypatch.setattr(scrape_favicon, "upload_favicon_to_azure",
+                        upload_while_another_worker_stores_it)
+
+    with sqlite3.connect(db_path) as connection:
+        assert store_favicon(connection.cursor(), 1, FAVICON)
+
+        images = connection.execute("SELECT id, image_url FROM company_images").fetchall()
+        assert images == [(1, "https://blob/2.png")]
+        assert connection.execute("SELECT image_id FROM companies WHERE id = 1").fetchone() == (1,)
+
+
+def test_store_favicon_reuses_existing_image_without_upload(db_path, monkeypatch):
+    monkeypatch.setattr(scrape_favicon, "upload_favicon_to_azure",
+                        lambda favicon_data, company_id: f"https://blob/{company_id}.png")
+
+    with sqlite3.connect(db_path) as connection:
+        assert store_favicon(connection.cursor(), 1, FAVICON)
+        monkeypatch.setattr(scrape_favicon, "upload_favicon_to_azure", None)
+        assert store_favicon(connection.cursor(), 2, FAVICON)
+
+        assert connection.execute(
+            "SELECT id, image_id FROM companies ORDER BY id").fetchall() == [(1, 1), (2, 1)]
@@ -0,0 +1,35 @@
+import pytest
+
+from websites import canonicalize_website
+
+
+@pytest.mark.parametrize("website", [
+    "x.com",
+    "X.com",
+    "http://x.com",
+    "https://x.com",
+    "https://www.x.com/",
+    "HTTPS://WWW.X.COM//",
+    "http://x.com:80/",
+    "https://x.com:443",
+    "https://x.com/#about",
+    "  www.x.com.  ",
+])
+def test_spellings_of_one_site_are_equal(website):
+    assert canonicalize_website(website) == "x.com"
+
+
+@pytest.mark.parametrize("website,canonical", [
+    ("https://x.com/about/", "x.com/about"),
+    ("https://x.com/?lang=en", "x.com?lang=en"),
+    ("http://x.com:8080/", "x.com:8080"),
+    ("https://shop.x.com", "shop.x.com"),
+    ("https://bücher.de", "xn--bcher-kva.de"),
+])
+def test_different_sites_stay_apart(website, canonical):
+    assert canonicalize_website(website) == canonical
+
+
+@pytest.mark.parametrize("website", [None, "", "   "])
+def test_empty_website(website):
+    assert canonicalize_website(website) is None
@@ -0,0 +1,114 @@
+"""Startup warm-up of the API, run by the lifespan handler of `main.py`.
+
+Opens the connections of the pool before the first request needs them, preloads
+the small reference tables into `reference_cache` and optionally reads the hot
+indexes once, so their pages are in the OS page cache (shared by all workers of
+a read replica) instead of being loaded by the first requests.
+
+- WARMUP_CONNECTIONS: connections to open, the pool size by default
+- WARMUP_PREREAD_INDEXES: set to 0 to skip reading the hot indexes
+"""
+import os
+import time
+
+from sqlmodel import Session, select
+
+from fast_json import fetch_rows, public_columns
+from models import (Country, CountryPublic, Industry, IndustryPublic, NumberOfEmployees,
+                    NumberOfEmployeesPublic)
+from reference_versions import reference_version
+
+
+# Small tables read by every client, served from memory: name -> (table, public model).
+# Same tables as reference_versions.VERSIONED_TABLES
+REFERENCE_TABLES = {
+    'countries': (Country, CountryPublic),
+    'industries': (Industry, IndustryPublic),
+    'number_of_employees': (NumberOfEmployees, NumberOfEmployeesPublic),
+}
+
+# Indexes used by the filters and sorts of the companies list: (table, index)
+HOT_INDEXES = (
+    ('companies', 'ix_companies_own_image'),
+    ('companies', 'ix_companies_own_image_year'),
+    ('companies', 'ix_companies_own_image_employees_year'),
+)
+
+
+class ReferenceCache:
+    """Rows of the reference tables kept in memory.
+
+    The rows of a table are loaded again when its version in `reference_versions`
+    changed, after a write to that table by this worker or any other process. A
+    read replica has the versions of the database it was published from.
+    """
+
+    def __init__(self):
+        # name -> (version, rows)
+        self.tables = {}
+
+    def get(self, session, name):
+        """Return the rows of a reference table as dicts, loading them if needed."""
+        connection = session.connection()
+        version = reference_version(connection.exec_driver_sql, name)
+
+        cached = self.tables.get(name)
+        if cached is None or cached[0] != version:
+            table, public_model = REFERENCE_TABLES[name]
+            # Replaced in one assignment, concurrent requests at worst load it twice
+            cached = self.tables[name] = (version, fetch_rows(session, select(
+                *public_columns(table, public_model)).order_by(table.id)))
+
+        return cached[1]
+
+    def close(self):
+        self.tables.clear()
+
+
+reference_cache = ReferenceCache()
+
+
+def warm_connection_pool(engine, connections):
+    """Open `connections` connections at the same time, so the pool keeps them open."""
+    opened = [engine.connect() for _ in range(connections)]
+    try:
+        for connection in opened:
+            connection.exec_driver_sql("SELECT 1")
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+def preread_indexes(engine):
+    """Read every page of the hot indexes once."""
+    with engine.connect() as connection:
+        for table, index in HOT_INDEXES:
+            connection.exec_driver_sql(
+                f"SELECT count(*) FROM {table} INDEXED BY {index}")
+
+
+def warm_up(engine):
+    """Warm the connection pool, the reference cache and the hot indexes.
+
+    Returns a summary of what was done, shown by the readiness endpoint.
+    """
+    start = time.perf_counter()
+    pool_size = getattr(engine.pool, "size", lambda: 1)()
+    connections = int(os.environ.get("WARMUP_CONNECTIONS", pool_size))
+
+    warm_connection_pool(engine, connections)
+
+    with Session(engine) as session:
+        reference_rows = {
+            name: len(reference_cache.get(session, name)) for name in REFERENCE_TABLES}
+
+    preread = os.environ.get("WARMUP_PREREAD_INDEXES", "1") != "0"
+    if preread:
+        preread_indexes(engine)
+
+    return {
+        "connections": connections,
+        "reference_rows": reference_rows,
+        "preread_indexes": [index for _, index in HOT_INDEXES] if preread else [],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
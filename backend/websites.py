@@ -0,0 +1,46 @@
+from urllib.parse import urlsplit
+
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+def canonicalize_website(website):
+    """Normalize a website link so that every spelling of one site compares equal.
+
+    The scheme, a leading `www.`, default ports, trailing slashes and the fragment
+    are dropped, the host is lowercased and internationalized domains are
+    converted to punycode, so `http://x.com`, `https://www.x.com/` and `X.com`
+    all become `x.com`. Returns None for an empty link.
+    """
+    website = (website or "").strip()
+    if not website:
+        return None
+
+    if "://" not in website:
+        website = f"http://{website}"
+
+    parts = urlsplit(website)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+
+    try:
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    host = host.lower()
+
+    if host.startswith("www."):
+        host = host[4:]
+
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and str(port) != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+
+    canonical = host + parts.path.rstrip("/")
+    if parts.query:
+        canonical += f"?{parts.query}"
+
+    return canonical
@@ -0,0 +1,122 @@
+import argparse
+
+import json
+
+import os
+
+import sqlite3
+
+import subprocess
+
+import sys
+
+import tempfile
+
+import time
+
+from contextlib import redirect_stdout
+
+from crawler_standins import blob_connection_string, proxy_url, site_url
+
+
+def start_standins(args):
+    """Run crawler_standins.py in its own process, so it does not count in the measurements."""
+    process = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(
+            os.path.abspath(__file__)), "crawler_standins.py"),
+        "--latency", str(args.latency),
+        "--error-rate", str(args.error_rate),
+        "--redirects", str(args.redirects),
+        "--oversized-page-mb", str(args.oversized_page_mb),
+        "--blob-latency", str(args.blob_latency),
+        "--seed", str(args.seed),
+    ], stdout=subprocess.PIPE, text=True)
+    port = int(process.stdout.readline())
+
+    return process, port
+
+
+def create_sites_database(db_path, sites):
+    """Create a database of `sites` companies whose websites are served by the stand-in."""
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE companies (id INTEGER PRIMARY KEY, website TEXT NOT NULL)")
+    conn.executemany("INSERT INTO companies (id, website) VALUES (?, ?)", (
+        (site_id, site_url(site_id)) for site_id in range(1, sites + 1)))
+    conn.commit()
+    conn.close()
+
+
+def run_benchmark(args):
+    """Crawl synthetic sites with `update_favicons_in_db` and return the crawler summary."""
+    process, port = start_standins(args)
+
+    try:
+        # Must be set before scrape_favicon creates its blob client
+        os.environ["AZURE_STORAGE_CONNECTION_STRING"] = blob_connection_string(port)
+        # Websites are only reachable through the stand-in, blob uploads go to it directly
+        os.environ["HTTP_PROXY"] = proxy_url(port)
+        os.environ["NO_PROXY"] = "127.0.0.1"
+        from scrape_favicon import update_favicons_in_db
+
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "bench_scraper.db")
+            summary_path = os.path.join(directory, "summary.json")
+            create_sites_database(db_path, args.sites)
+
+            # The scraper prints a few lines per site, keep them out of the report
+            with open(args.log, "w") as log, redirect_stdout(log):
+                update_favicons_in_db(db_path, max_workers=args.workers,
+                                      progress_interval=args.progress_interval, summary_path=summary_path)
+
+            with open(summary_path) as summary_file:
+                return json.load(summary_file)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the favicon scraper offline against synthetic websites and blob storage.")
+    parser.add_argument("--sites", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="seconds added to every website response")
+    parser.add_argument("--error-rate", type=float, default=0.02,
+                        help="share of website requests failing with 503")
+    parser.add_argument("--redirects", type=int, default=1,
+                        help="redirects before every homepage")
+    parser.add_argument("--oversized-page-mb", type=int, default=5)
+    parser.add_argument("--blob-latency", type=float, default=0.02,
+                        help="seconds added to every blob upload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--progress-interval", type=float, default=10)
+    parser.add_argument("--log", default="bench_scraper.log",
+                        help="file receiving the scraper output")
+    parser.add_argument("--output", default="bench_scraper.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = run_benchmark(args)
+    report = {
+        "config": vars(args),
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        **summary,
+    }
+
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+
+    print(f"{summary['sites_ok']}/{summary['total_sites']} sites got a favicon, "
+          f"{summary['sites_per_second']} sites/s, {summary['process_cpu_seconds']}s CPU, "
+          f"peak RSS {summary['peak_rss_mb']} MB")
+    print(f"{'stage':16}{'count':>8}{'p50 s':>9}{'p95 s':>9}{'cpu ms/run':>12}{'max MB':>9}  outcomes")
+    for name, stage in summary["stages"].items():
+        print(f"{name:16}{stage['count']:>8}{stage['p50_seconds']:>9}{stage['p95_seconds']:>9}"
+              f"{stage['mean_cpu_seconds'] * 1000:>12.2f}{stage['max_bytes'] / 1024 / 1024:>9.2f}  {stage['outcomes']}")
+    print(f"Report written to {args.output}, scraper output to {args.log}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import json
+
+import resource
+
+import sys
+
+import threading
+
+import time
+
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class StageMetrics:
+    """Latency histogram, outcome counters and in-flight gauge of one crawler stage."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.total_bytes = 0
+        self.max_bytes = 0
+        self.outcomes = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def quantile(self, q):
+        """Estimate a latency quantile as the upper bound of the bucket holding it."""
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (self.max_seconds,), self.buckets):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max_seconds), 4)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "outcomes": dict(self.outcomes),
+            "mean_seconds": round(self.total_seconds / self.count, 4) if self.count else None,
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "max_seconds": round(self.max_seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "mean_cpu_seconds": round(self.cpu_seconds / self.count, 6) if self.count else None,
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_in_flight": self.max_in_flight,
+            "latency_buckets": {
+                str(bound): count for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), self.buckets)
+            },
+        }
+
+
+class StageOutcome:
+    """Outcome of one stage run, "ok" unless changed or an exception escapes.
+
+    `bytes` is the size of the largest buffer the run held (downloaded body,
+    decoded pixels...), memory use of concurrent threads cannot be told apart
+    otherwise.
+    """
+
+    def __init__(self):
+        self.outcome = "ok"
+        self.bytes = 0
+
+
+class CrawlerMetrics:
+    """Thread-safe metrics of the favicon crawler, stage by stage and site by site."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, total_sites=0):
+        with self.lock:
+            self.stages = {}
+            self.total_sites = total_sites
+            self.sites_ok = 0
+            self.sites_failed = 0
+            self.started_at = time.monotonic()
+            self.cpu_started_at = time.process_time()
+
+    @contextmanager
+    def stage(self, name):
+        """Measure one run of a stage.
+
+        Exceptions are counted by their class and re-raised. The block can set
+        `outcome` on the yielded object, for example to "cancelled", and `bytes`.
+        CPU time is measured for the running thread only, so it is not inflated
+        by other sites processed at the same time.
+        """
+        result = StageOutcome()
+        with self.lock:
+            stage = self.stages.setdefault(name, StageMetrics())
+            stage.in_flight += 1
+            stage.max_in_flight = max(stage.max_in_flight, stage.in_flight)
+        start = time.monotonic()
+        cpu_start = time.thread_time()
+
+        try:
+            yield result
+        except Exception as e:
+            result.outcome = type(e).__name__
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            cpu_elapsed = time.thread_time() - cpu_start
+            with self.lock:
+                stage.in_flight -= 1
+                stage.cpu_seconds += cpu_elapsed
+                stage.total_bytes += result.bytes
+                stage.max_bytes = max(stage.max_bytes, result.bytes)
+                stage.count += 1
+                stage.total_seconds += elapsed
+                stage.max_seconds = max(stage.max_seconds, elapsed)
+                stage.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+                stage.outcomes[result.outcome] = stage.outcomes.get(
+                    result.outcome, 0) + 1
+
+    def site_finished(self, success):
+        with self.lock:
+            if success:
+                self.sites_ok += 1
+            else:
+                self.sites_failed += 1
+
+    def progress_line(self):
+        with self.lock:
+            done = self.sites_ok + self.sites_failed
+            elapsed = time.monotonic() - self.started_at
+            percent = 100 * done / self.total_sites if self.total_sites else 0
+            in_flight = " ".join(
+                f"{name}={stage.in_flight}" for name, stage in self.stages.items() if stage.in_flight)
+
+            return (f"Progress: {done}/{self.total_sites} sites ({percent:.1f}%), {self.sites_ok} ok, "
+                    f"{self.sites_failed} failed, {done / elapsed if elapsed else 0:.2f} sites/s"
+                    f" | in flight: {in_flight or 'none'}")
+
+    def summary(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started_at
+            done = self.sites_ok + self.sites_failed
+
+            return {
+                "total_sites": self.total_sites,
+                "sites_ok": self.sites_ok,
+                "sites_failed": self.sites_failed,
+                "elapsed_seconds": round(elapsed, 3),
+                "sites_per_second": round(done / elapsed, 3) if elapsed else None,
+                "process_cpu_seconds": round(time.process_time() - self.cpu_started_at, 3),
+                "peak_rss_mb": peak_rss_mb(),
+                "stages": {name: stage.summary() for name, stage in self.stages.items()},
+            }
+
+    @contextmanager
+    def report_progress(self, interval=10):
+        """Print a progress line every `interval` seconds while the block runs."""
+        stop = threading.Event()
+
+        def report():
+            while not stop.wait(interval):
+                print(self.progress_line())
+
+        reporter = threading.Thread(target=report, daemon=True)
+        reporter.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            reporter.join()
+
+    def summary_json(self):
+        return json.dumps(self.summary(), indent=2)
+
+
+crawler_metrics = CrawlerMetrics()
@@ -0,0 +1,269 @@
+import argparse
+
+import json
+
+import random
+
+import threading
+
+import time
+
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlsplit
+from PIL import Image
+
+
+# Kinds of synthetic websites and how common they are
+SITE_KINDS = {
+    "link_icons": 40,  # <link rel=icon> PNGs in several sizes and an apple-touch-icon
+    "manifest": 15,  # icons only in a web app manifest
+    "ico_only": 15,  # no links, only the /favicon.ico fallback
+    "svg_only": 5,  # a scalable icon Pillow cannot decode
+    "huge_png": 5,  # a 4096x4096 PNG, cheap to download but big once decoded
+    "oversized_page": 5,  # homepage of several MB with the icon link at the end
+    "broken_icons": 10,  # every advertised icon answers 404
+    "server_error": 5,  # homepage answers 500
+}
+HUGE_PNG_SIZE = 4096
+# Sites are served at http://site-<id>.test/ through the stand-in used as HTTP proxy,
+# so every site has its own host and its own /favicon.ico (.test never resolves)
+SITE_HOST_SUFFIX = ".test"
+BLOB_ACCOUNT = "devstoreaccount1"
+# Well known key of the Azure storage emulator, the stand-in does not check signatures
+BLOB_ACCOUNT_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+
+
+class StandinConfig:
+    """Behaviour of the stand-in server.
+
+    - latency: seconds added to every website response, +-50% jitter
+    - error_rate: share of website requests that fail with 503 whatever the site
+    - redirects: number of redirects before the homepage of every site
+    - oversized_page_mb: size of the homepages of "oversized_page" sites
+    - blob_latency: seconds added to every blob upload
+    """
+
+    def __init__(self, latency=0.05, error_rate=0.02, redirects=1, oversized_page_mb=5,
+                 blob_latency=0.02, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.redirects = redirects
+        self.oversized_page_mb = oversized_page_mb
+        self.blob_latency = blob_latency
+        self.seed = seed
+
+
+def site_kind(site_id, seed=0):
+    """Return the kind of a site, always the same for the same site and seed."""
+    rng = random.Random(seed * 1_000_003 + site_id)
+    return rng.choices(list(SITE_KINDS), weights=list(SITE_KINDS.values()))[0]
+
+
+def site_color(site_id):
+    """A color unique to the site, so its icons do not share a hash with other sites."""
+    return (site_id % 256, site_id // 256 % 256, site_id // 65536 % 256, 255)
+
+
+@lru_cache(maxsize=1024)
+def png_icon(site_id, size):
+    buffer = BytesIO()
+    Image.new("RGBA", (size, size), site_color(site_id)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=1024)
+def ico_icon(site_id):
+    buffer = BytesIO()
+    Image.new("RGBA", (32, 32), site_color(site_id)).save(
+        buffer, format="ICO", sizes=[(16, 16), (32, 32)])
+    return buffer.getvalue()
+
+
+def svg_icon(site_id):
+    red, green, blue, _ = site_color(site_id)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 64 64">'
+            f'<rect width="64" height="64" fill="rgb({red},{green},{blue})"/></svg>').encode()
+
+
+@lru_cache(maxsize=16)
+def huge_png(site_id):
+    image = Image.new("RGBA", (HUGE_PNG_SIZE, HUGE_PNG_SIZE), (255, 255, 255, 255))
+    image.paste(site_color(site_id), (0, 0, 64, 64))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def homepage(site_id, kind, config):
+    """Return the HTML of a site's homepage."""
+    links = []
+
+    if kind in ("link_icons", "broken_icons", "oversized_page"):
+        links += [
+            '<link rel="icon" type="image/png" sizes="32x32" href="/icon-32.png">',
+            '<link rel="icon" type="image/png" sizes="192x192" href="/icon-192.png">',
+            '<link rel="apple-touch-icon" href="/icon-180.png">',
+        ]
+    elif kind == "manifest":
+        links.append('<link rel="manifest" href="/manifest.json">')
+    elif kind == "svg_only":
+        links.append(
+            '<link rel="icon" type="image/svg+xml" sizes="any" href="/icon.svg">')
+    elif kind == "huge_png":
+        links.append('<link rel="icon" href="/huge.png">')
+
+    body = "<p>Synthetic company homepage.</p>"
+    if kind == "oversized_page":
+        # Padding first, the scraper has to read the whole page to find the icons
+        paragraph = "<p>" + "Lorem ipsum dolor sit amet. " * 36 + "</p>\n"
+        body = paragraph * (config.oversized_page_mb * 1024 * 1024 // len(paragraph))
+        return f"<html><head><title>Site {site_id}</title></head><body>{body}{''.join(links)}</body></html>".encode()
+
+    return f"<html><head><title>Site {site_id}</title>{''.join(links)}</head><body>{body}</body></html>".encode()
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Serves synthetic websites by host name and accepts blob uploads.
+
+    Website requests arrive in proxy form (`GET http://site-<id>.test/path`), blob
+    uploads directly on the port of the server.
+    """
+
+    protocol_version = "HTTP/1.1"
+    config = StandinConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b"", content_type="text/plain", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def requested_site(self):
+        """Return `(site_id, path)` of a website request, or None."""
+        target = urlsplit(self.path)
+        host = (target.hostname or self.headers.get("Host", "").split(":")[0]).lower()
+        name = host.removesuffix(SITE_HOST_SUFFIX)
+        if name == host or not name.startswith("site-") or not name[len("site-"):].isdigit():
+            return None
+        return int(name[len("site-"):]), target.path or "/"
+
+    def do_GET(self):
+        config = self.config
+        if config.latency:
+            time.sleep(config.latency * random.uniform(0.5, 1.5))
+        if random.random() < config.error_rate:
+            return self.send(503, b"Service unavailable")
+
+        site = self.requested_site()
+        if site is None:
+            return self.send(404, b"Not found")
+
+        site_id, path = site
+        kind = site_kind(site_id, config.seed)
+        parts = path.strip("/").split("/")
+        resource_name = parts[0]
+
+        if resource_name == "" or resource_name == "redirect":
+            hop = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+            if hop < config.redirects:
+                return self.send(302, headers={"Location": f"/redirect/{hop + 1}"})
+            if kind == "server_error":
+                return self.send(500, b"Internal server error")
+            return self.send(200, homepage(site_id, kind, config), "text/html; charset=utf-8")
+
+        if resource_name == "favicon.ico":
+            # Fallback of every site, even when its advertised icons are broken
+            return self.send(200, ico_icon(site_id), "image/x-icon")
+        if kind == "broken_icons":
+            return self.send(404, b"Not found")
+        if resource_name.startswith("icon-") and resource_name.endswith(".png"):
+            size = resource_name[len("icon-"):-len(".png")]
+            if size.isdigit() and 0 < int(size) <= 512:
+                return self.send(200, png_icon(site_id, int(size)), "image/png")
+        if resource_name == "icon.svg":
+            return self.send(200, svg_icon(site_id), "image/svg+xml")
+        if resource_name == "huge.png":
+            return self.send(200, huge_png(site_id), "image/png")
+        if resource_name == "manifest.json":
+            manifest = {"name": f"Site {site_id}", "icons": [
+                {"src": "icon-48.png", "sizes": "48x48", "type": "image/png"},
+                {"src": "icon-512.png", "sizes": "512x512", "type": "image/png"},
+            ]}
+            return self.send(200, json.dumps(manifest).encode(), "application/manifest+json")
+
+        return self.send(404, b"Not found")
+
+    do_HEAD = do_GET
+
+    def do_PUT(self):
+        """Accept a Put Blob request of the Azure Blob Storage REST API, the blob is dropped."""
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.config.blob_latency:
+            time.sleep(self.config.blob_latency * random.uniform(0.5, 1.5))
+
+        self.send(201, headers={
+            "ETag": f'"0x{time.time_ns():X}"',
+            "Last-Modified": self.date_time_string(),
+            "x-ms-request-id": f"{time.time_ns()}",
+            "x-ms-version": self.headers.get("x-ms-version", "2021-08-06"),
+            "x-ms-request-server-encrypted": "true",
+        })
+
+
+def serve_standins(config, port=0):
+    """Start the stand-in server in a background thread and return it.
+
+    Websites are served at `site_url(site_id)` to clients using `proxy_url(port)`
+    as HTTP proxy, and blobs are accepted at `blob_connection_string(port)`.
+    """
+    handler = type("ConfiguredStandinHandler",
+                   (StandinHandler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def site_url(site_id):
+    return f"http://site-{site_id}{SITE_HOST_SUFFIX}/"
+
+
+def proxy_url(port):
+    return f"http://127.0.0.1:{port}"
+
+
+def blob_connection_string(port):
+    return (f"DefaultEndpointsProtocol=http;AccountName={BLOB_ACCOUNT};AccountKey={BLOB_ACCOUNT_KEY};"
+            f"BlobEndpoint=http://127.0.0.1:{port}/{BLOB_ACCOUNT};")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve synthetic websites and a blob storage stand-in for the favicon scraper.")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--redirects", type=int, default=1)
+    parser.add_argument("--oversized-page-mb", type=int, default=5)
+    parser.add_argument("--blob-latency", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = serve_standins(StandinConfig(
+        args.latency, args.error_rate, args.redirects, args.oversized_page_mb, args.blob_latency, args.seed), args.port)
+    port = server.server_address[1]
+    # First line is read by bench_scraper.py
+    print(port, flush=True)
+    print(f"Websites: {site_url('<id>')} through the HTTP proxy {proxy_url(port)}", flush=True)
+    print(f"Blob storage: {blob_connection_string(port)}", flush=True)
+    threading.Event().wait()
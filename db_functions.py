@@ -1,5 +1,7 @@
 import sqlite3
 
+from backend.websites import canonicalize_website
+
 
 def get_all_companies(db_path):
     conn = sqlite3.connect(db_path)
@@ -25,29 +27,136 @@ def get_companies_not_null(db_path):
     return companies
 
 
-def delete_duplicate_websites(db_path):
-    """Delete all companies with repeated websites, keeping only one record per unique website."""
+def add_canonical_website_column(db_path):
+    """Ensure `companies` has the `canonical_website` column and its unique index."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(companies)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if "canonical_website" not in columns:
+        cursor.execute(
+            "ALTER TABLE companies ADD COLUMN canonical_website VARCHAR(256)")
+
+    # NULLs do not collide, so rows that are not merged yet can coexist
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_companies_canonical_website
+        ON companies (canonical_website)
+    """)
+
+    conn.commit()
+    conn.close()
+
+
+def merge_company_into(cursor, duplicate_id, survivor_id):
+    """Fold a duplicate company into the survivor and delete the duplicate.
+
+    Links missing on the survivor are taken over from the duplicate and its images
+    are reassigned to the survivor.
+    """
+    cursor.execute("""
+        UPDATE companies
+        SET image_id = COALESCE(image_id, (SELECT image_id FROM companies WHERE id = :duplicate)),
+            linkedin = COALESCE(linkedin, (SELECT linkedin FROM companies WHERE id = :duplicate)),
+            facebook = COALESCE(facebook, (SELECT facebook FROM companies WHERE id = :duplicate)),
+            twitter = COALESCE(twitter, (SELECT twitter FROM companies WHERE id = :duplicate))
+        WHERE id = :survivor
+    """, {"duplicate": duplicate_id, "survivor": survivor_id})
+    cursor.execute(
+        "UPDATE company_images SET company_id = ? WHERE company_id = ?", (survivor_id, duplicate_id))
+    cursor.execute("DELETE FROM companies WHERE id = ?", (duplicate_id,))
+
+
+def merge_duplicate_websites(db_path, batch_size=1000):
+    """Fill `canonical_website` for companies that miss it and merge duplicates.
+
+    Rows are processed in id order and committed batch by batch, so the job can be
+    interrupted and rerun at any time and only touches rows not merged yet. A company
+    whose canonical website is already taken is folded into the company holding it.
+    """
+    add_canonical_website_column(db_path)
+
+    merged = 0
     try:
-        # Connect to the database
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
+        last_id = 0
+
+        while True:
+            cursor.execute("""
+                SELECT id, website FROM companies
+                WHERE canonical_website IS NULL AND id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, batch_size))
+            companies = cursor.fetchall()
+            if not companies:
+                break
+
+            for company_id, website in companies:
+                last_id = company_id
+                canonical_website = canonicalize_website(website)
+                if not canonical_website:
+                    continue
+
+                cursor.execute(
+                    "SELECT id FROM companies WHERE canonical_website = ?", (canonical_website,))
+                survivor = cursor.fetchone()
+
+                if survivor:
+                    merge_company_into(cursor, company_id, survivor[0])
+                    merged += 1
+                else:
+                    cursor.execute(
+                        "UPDATE companies SET canonical_website = ? WHERE id = ?", (canonical_website, company_id))
+
+            conn.commit()
 
-        # Find duplicate websites and keep only the one with the lowest id
-        cursor.execute("""
-            DELETE FROM companies
-            WHERE id NOT IN (
-                SELECT MIN(id)
-                FROM companies
-                GROUP BY website
-            )
-        """)
-
-        # Commit the changes and close the connection
-        conn.commit()
         conn.close()
-        print("Duplicate websites have been removed. Only one record per website remains.")
+        print(f"Merged {merged} duplicate companies. Only one record per website remains.")
     except Exception as e:
-        print(f"Error deleting duplicate websites: {e}")
+        print(f"Error merging duplicate websites: {e}")
+
+    return merged
+
+
+def insert_companies(db_path, companies):
+    """Bulk insert companies, skipping websites that are already in the database.
+
+    `companies` is an iterable of dicts with the columns of the `companies` table.
+    Returns the number of inserted rows.
+    """
+    add_canonical_website_column(db_path)
+
+    rows = []
+    for company in companies:
+        company = dict(company)
+        company["canonical_website"] = canonicalize_website(company.get("website"))
+        rows.append(company)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    columns = ("about", "year_founded", "website", "number_of_employees_id",
+               "linkedin", "facebook", "twitter", "image_id", "canonical_website")
+    insert_company = f"""
+        INSERT INTO companies ({", ".join(columns)})
+        VALUES ({", ".join(f":{column}" for column in columns)})
+        ON CONFLICT (canonical_website) DO NOTHING
+        RETURNING id
+    """
+
+    # `total_changes` also counts the rows written by triggers (change feed, image
+    # flag), RETURNING only returns the company when it was inserted
+    inserted = 0
+    for row in rows:
+        cursor.execute(insert_company, {column: row.get(column) for column in columns})
+        inserted += len(cursor.fetchall())
+
+    conn.commit()
+    conn.close()
+
+    return inserted
 
 
 def drop_data_from_company_images(db_path):
@@ -0,0 +1,75 @@
+import sqlite3
+
+import threading
+
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.favicon_queue import (claim_favicon_job, create_favicon_queue, finish_favicon_job,
+                                   requeue_stale_favicon_jobs)
+from scrape_favicon import initialize_database, process_company
+
+
+def connect(db_path):
+    """Open a connection that waits for the API and other workers instead of failing on locks."""
+    return sqlite3.connect(db_path, timeout=30)
+
+
+def run_favicon_job(db_path, job_id, company_id):
+    """Run one favicon job with the scraper logic and record its outcome."""
+    conn = connect(db_path)
+
+    try:
+        company = conn.execute(
+            "SELECT id, website FROM companies WHERE id = ?", (company_id,)).fetchone()
+
+        if not company:
+            finish_favicon_job(conn.execute, job_id,
+                               error="Company not found", retry=False)
+        elif process_company(company, db_path):
+            finish_favicon_job(conn.execute, job_id)
+        else:
+            finish_favicon_job(conn.execute, job_id,
+                               error=f"No favicon stored for website: {company[1]}")
+    except Exception as e:
+        print(f"Error running favicon job {job_id}: {e}")
+        finish_favicon_job(conn.execute, job_id, error=str(e))
+    finally:
+        conn.commit()
+        conn.close()
+
+
+def run_favicon_worker(db_path, max_workers=5, poll_interval=1):
+    """Run queued favicon jobs forever, `max_workers` at a time."""
+    initialize_database(db_path)  # Ensure the database schema is ready
+
+    conn = connect(db_path)
+    create_favicon_queue(conn.execute)
+    # Jobs left running by a previous worker will never finish otherwise
+    requeue_stale_favicon_jobs(conn.execute)
+    conn.commit()
+
+    free_workers = threading.Semaphore(max_workers)
+    print(f"Favicon worker started with {max_workers} workers.")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            free_workers.acquire()
+
+            job = claim_favicon_job(conn.execute)
+            conn.commit()
+
+            if not job:
+                free_workers.release()
+                time.sleep(poll_interval)
+                continue
+
+            job_id, company_id = job
+            future = executor.submit(run_favicon_job, db_path, job_id, company_id)
+            future.add_done_callback(lambda _: free_workers.release())
+
+
+if __name__ == "__main__":
+    database_path = "backend/companies.db"  # Path to your SQLite database
+    run_favicon_worker(database_path)
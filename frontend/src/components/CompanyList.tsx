@@ -1,10 +1,10 @@
 import { useState, useEffect } from "react";
-import type { Company, CompanyImage } from "../types";
+import type { CompanyCard, CompanyImage } from "../types";
 
 import { API_URL } from "../contants.js";
 
 interface CompanyListProps {
-  companies: Company[];
+  companies: CompanyCard[];
 }
 
 export function CompanyList({ companies }: CompanyListProps) {
@@ -13,13 +13,14 @@ export function CompanyList({ companies }: CompanyListProps) {
   useEffect(() => {
     const fetchImages = async () => {
       try {
+        // Snapshot companies already come with their image URL
         const imagePromises = companies
-          .filter((company) => company.image_id)
+          .filter((company) => company.image_id && !company.image_url)
           .map((company) =>
             fetch(`${API_URL}/company-images/${company.image_id}`)
               .then((res) => res.json())
-              .then((data: CompanyImage) => ({ id: company.image_id, url: data.image_url }))
-              .catch(() => ({ id: company.image_id, url: "/placeholder.svg" }))
+              .then((data: CompanyImage) => ({ id: company.image_id as number, url: data.image_url }))
+              .catch(() => ({ id: company.image_id as number, url: "/placeholder.svg" }))
           );
 
         const images = await Promise.all(imagePromises);
@@ -40,7 +41,7 @@ export function CompanyList({ companies }: CompanyListProps) {
         <div key={company.id} className="border rounded-lg p-4 shadow-sm flex flex-col items-center">
           <div className="mb-4 w-20 h-20 flex items-center justify-center">
             <img
-              src={companyImages[company.image_id] || "/placeholder.svg"}
+              src={company.image_url || (company.image_id && companyImages[company.image_id]) || "/placeholder.svg"}
               alt={`${company.website} logo`}
               className="w-20 h-20 object-contain"
               onError={(e) => {
@@ -1 +1,3 @@
 export const API_URL = "http://20.215.226.148:8000";
+
+export const PAGE_SIZE = 9;
@@ -0,0 +1,44 @@
+import { readFile } from "node:fs/promises";
+import { resolve } from "node:path";
+import type { CompanyCard, Snapshot } from "./types";
+
+import { API_URL, PAGE_SIZE } from "./contants.js";
+
+// Written by `python snapshot.py` in the backend, relative to the project root
+const SNAPSHOT_PATH = resolve("src/data/snapshot.json");
+
+let snapshotPromise: Promise<Snapshot> | null = null;
+
+async function fetchSnapshot(): Promise<Snapshot> {
+  try {
+    const snapshot: Snapshot = JSON.parse(await readFile(SNAPSHOT_PATH, "utf-8"));
+    // Pages of another size would not match the page numbers of the site
+    if (snapshot.page_size === PAGE_SIZE) {
+      return snapshot;
+    }
+    console.warn(`${SNAPSHOT_PATH} has pages of ${snapshot.page_size} companies instead of ${PAGE_SIZE}, using the API`);
+  } catch {
+    // No local snapshot, ask the API for one
+  }
+
+  const response = await fetch(`${API_URL}/snapshot/?page_size=${PAGE_SIZE}`);
+  if (!response.ok) {
+    throw new Error("Failed to fetch companies snapshot");
+  }
+  const snapshot: Snapshot = await response.json();
+  if (snapshot.page_size !== PAGE_SIZE) {
+    throw new Error(`Companies snapshot has pages of ${snapshot.page_size} companies instead of ${PAGE_SIZE}`);
+  }
+  return snapshot;
+}
+
+// The whole build shares one snapshot instead of requesting every page and image
+export function loadSnapshot(): Promise<Snapshot> {
+  snapshotPromise ??= fetchSnapshot();
+  return snapshotPromise;
+}
+
+export function snapshotPage(snapshot: Snapshot, page: number): CompanyCard[] {
+  const rows = snapshot.pages[page - 1] ?? [];
+  return rows.map((row) => Object.fromEntries(snapshot.fields.map((field, i) => [field, row[i]])) as CompanyCard);
+}
@@ -10,8 +10,13 @@ export interface Company {
   image_id: number;
 }
 
+export type CompanyCard = Pick<Company, "id" | "website" | "year_founded" | "about"> & {
+  image_id?: number;
+  image_url?: string;
+};
+
 export interface ApiResponse {
-  items: Company[];
+  items: CompanyCard[];
   total: number;
   page: number;
   size: number;
@@ -22,3 +27,12 @@ export interface CompanyImage {
   id: number;
   image_url: string;
 }
+
+export interface Snapshot {
+  format: number;
+  version: string;
+  fields: string[];
+  page_size: number;
+  total: number;
+  pages: (string | number)[][][];
+}
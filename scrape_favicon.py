@@ -1,24 +1,28 @@
 from azure.storage.blob import BlobServiceClient
 
+import os
+
 import sqlite3
 
 import requests
 from urllib.parse import urljoin, urlparse
 
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
 
 from io import BytesIO
 from PIL import Image
 
 import hashlib
 
-import time
-
-from db_functions import delete_duplicate_websites
+from backend.change_feed import create_change_feed
+from crawler_metrics import crawler_metrics
+from db_functions import merge_duplicate_websites
 
 
 # Azure Storage Configuration
-AZURE_STORAGE_CONNECTION_STRING = "DefaultEndpointsProtocol=https;AccountName=osintwebstorage;AccountKey=TgYesm49TbHEI0EqeUjXVShCui7ImRuE18pfbBiY2tfW6XteK//QymqCspk5/PBmdGceMO9LKcYI+AStcAq55A==;EndpointSuffix=core.windows.net"
+# Benchmarks point the scraper at a local stand-in, see bench_scraper.py
+AZURE_STORAGE_CONNECTION_STRING = os.environ.get("AZURE_STORAGE_CONNECTION_STRING") or "DefaultEndpointsProtocol=https;AccountName=osintwebstorage;AccountKey=TgYesm49TbHEI0EqeUjXVShCui7ImRuE18pfbBiY2tfW6XteK//QymqCspk5/PBmdGceMO9LKcYI+AStcAq55A==;EndpointSuffix=core.windows.net"
 CONTAINER_NAME = "companies-images"
 
 # Initialize Azure Blob Service Client
@@ -26,6 +30,14 @@ blob_service_client = BlobServiceClient.from_connection_string(
     AZURE_STORAGE_CONNECTION_STRING)
 container_client = blob_service_client.get_container_client(CONTAINER_NAME)
 
+# Favicon candidate racing
+FAVICON_RACE_WORKERS = 6  # concurrent candidate downloads per website
+FAVICON_TARGET_SIZE = 256  # an icon this large wins without waiting for the rest
+APPLE_TOUCH_ICON_SIZE = 180  # default size of apple-touch-icon without `sizes`
+
+# Seconds a write waits for the other workers to release the database
+DB_LOCK_TIMEOUT = 30
+
 
 def initialize_database(db_path):
     """Ensure the database schema includes the necessary tables and columns."""
@@ -50,30 +62,87 @@ def initialize_database(db_path):
         cursor.execute(
             "ALTER TABLE companies ADD COLUMN image_id INTEGER REFERENCES company_images(id)")
 
+    # Record image changes in the change feed
+    create_change_feed(cursor.execute)
+
     conn.commit()
     conn.close()
 
 
-def get_favicon_url(domain):
-    """Retrieve the favicon URL from a website's HTML."""
+def parse_icon_sizes(sizes):
+    """Return the largest square edge declared in a `sizes` attribute, 0 if unknown."""
+    best = 0
+    for size in (sizes or "").lower().split():
+        if size == "any":
+            # Scalable icon (usually SVG), treat it as big enough
+            return FAVICON_TARGET_SIZE
+        width, _, height = size.partition("x")
+        if width.isdigit() and height.isdigit():
+            best = max(best, min(int(width), int(height)))
+    return best
+
+
+def get_favicon_candidates(domain):
+    """Collect every favicon a website advertises.
+
+    Returns a tuple `(candidates, manifest_urls)` where `candidates` is a list of
+    `(icon_url, declared_size)` pairs taken from the `<link rel=icon>` and
+    `apple-touch-icon` tags plus the `/favicon.ico` fallback, and `manifest_urls`
+    are web app manifests whose icons still have to be resolved.
+    """
+    candidates = []
+    manifest_urls = []
+
     try:
-        response = requests.get(domain, timeout=20)
-        response.raise_for_status()
+        with crawler_metrics.stage("html_fetch") as fetch:
+            response = requests.get(domain, timeout=20)
+            response.raise_for_status()
+            fetch.bytes = len(response.content)
 
         from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.content, 'html.parser')
-        # Search for the favicon link in the HTML
-        icon_link = soup.find("link", rel=lambda x: x and 'icon' in x.lower())
-
-        if icon_link and 'href' in icon_link.attrs:
-            return urljoin(domain, icon_link['href'])
-        else:
-            # Fallback to common favicon path
-            parsed_url = urlparse(domain)
-            return f"{parsed_url.scheme}://{parsed_url.netloc}/favicon.ico"
+        # Resolve relative links against the final URL after redirects
+        base_url = response.url
+
+        for link in soup.find_all("link", href=True):
+            rel = link.get("rel") or []
+            rel = " ".join(rel).lower() if isinstance(rel, list) else rel.lower()
+
+            if "icon" in rel:
+                size = parse_icon_sizes(link.get("sizes"))
+                if not size and "apple-touch-icon" in rel:
+                    size = APPLE_TOUCH_ICON_SIZE
+                candidates.append((urljoin(base_url, link["href"]), size))
+            elif "manifest" in rel:
+                manifest_urls.append(urljoin(base_url, link["href"]))
     except Exception as e:
-        print(f"Error retrieving favicon for {domain}: {e}")
-        return None
+        print(f"Error retrieving favicon links for {domain}: {e}")
+
+    # Fallback to common favicon path
+    parsed_url = urlparse(domain)
+    candidates.append(
+        (f"{parsed_url.scheme}://{parsed_url.netloc}/favicon.ico", 0))
+
+    return candidates, manifest_urls
+
+
+def get_manifest_icons(manifest_url):
+    """Retrieve `(icon_url, declared_size)` pairs from a web app manifest."""
+    try:
+        with crawler_metrics.stage("manifest_fetch") as fetch:
+            response = requests.get(manifest_url, timeout=10)
+            response.raise_for_status()
+            fetch.bytes = len(response.content)
+            manifest = response.json()
+
+        return [
+            (urljoin(manifest_url, icon["src"]), parse_icon_sizes(icon.get("sizes")))
+            for icon in manifest.get("icons", [])
+            if isinstance(icon, dict) and icon.get("src")
+        ]
+    except Exception as e:
+        print(f"Error retrieving manifest icons from {manifest_url}: {e}")
+        return []
 
 
 def calculate_image_hash(image_data):
@@ -81,22 +150,91 @@ def calculate_image_hash(image_data):
     return hashlib.sha256(image_data).hexdigest()
 
 
-def download_and_convert_favicon(favicon_url):
-    """Download the favicon and convert it to PNG format."""
+def download_and_convert_favicon(favicon_url, cancel_event=None):
+    """Download the favicon and convert it to PNG format.
+
+    Returns a tuple `(png_data, size)` where `size` is the smallest edge of the
+    decoded image, or None if the download failed or was cancelled through
+    `cancel_event`.
+    """
     try:
-        response = requests.get(favicon_url, timeout=10, stream=True)
-        response.raise_for_status()
+        with crawler_metrics.stage("favicon_fetch") as fetch:
+            response = requests.get(favicon_url, timeout=10, stream=True)
+            response.raise_for_status()
+
+            content = BytesIO()
+            for chunk in response.iter_content(chunk_size=8192):
+                if cancel_event is not None and cancel_event.is_set():
+                    response.close()
+                    fetch.outcome = "cancelled"
+                    return None
+                content.write(chunk)
+            fetch.bytes = content.tell()
+
+        with crawler_metrics.stage("decode_convert") as convert:
+            content.seek(0)
+            img = Image.open(content).convert("RGBA")
+            convert.bytes = img.width * img.height * 4
+
+            png_buffer = BytesIO()
+            img.save(png_buffer, format="PNG")
+
+        return png_buffer.getvalue(), min(img.size)
+    except Exception as e:
+        if cancel_event is None or not cancel_event.is_set():
+            print(f"Error downloading or converting favicon from {
+                  favicon_url}: {e}")
+        return None
 
-        img = Image.open(BytesIO(response.content)).convert("RGBA")
 
-        png_buffer = BytesIO()
-        img.save(png_buffer, format="PNG")
+def fetch_best_favicon(candidates, manifest_urls):
+    """Download all favicon candidates concurrently and return the best one.
+
+    Every candidate is probed at the same time, manifests are resolved alongside
+    and their icons join the race as soon as they are known. The biggest valid
+    image wins; once an image at least `FAVICON_TARGET_SIZE` pixels wide arrives,
+    or nothing left in flight can beat the current best, the remaining requests
+    are cancelled. Returns the PNG data or None.
+    """
+    cancel_event = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=FAVICON_RACE_WORKERS)
+    # future -> declared icon size, None for manifest lookups
+    pending = {}
+    seen_urls = set()
+    best = None
+
+    def submit_candidates(new_candidates):
+        for icon_url, size in new_candidates:
+            if icon_url not in seen_urls:
+                seen_urls.add(icon_url)
+                pending[executor.submit(
+                    download_and_convert_favicon, icon_url, cancel_event)] = size
 
-        return png_buffer.getvalue()
-    except Exception as e:
-        print(f"Error downloading or converting favicon from {
-              favicon_url}: {e}")
-        return None
+    try:
+        submit_candidates(candidates)
+        for manifest_url in manifest_urls:
+            pending[executor.submit(get_manifest_icons, manifest_url)] = None
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                declared_size = pending.pop(future)
+                result = future.result()
+
+                if declared_size is None:
+                    submit_candidates(result)
+                elif result and (best is None or result[1] > best[1]):
+                    best = result
+
+            if best and (best[1] >= FAVICON_TARGET_SIZE or all(
+                    size is not None and 0 < size <= best[1] for size in pending.values())):
+                break
+    finally:
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return best[0] if best else None
 
 
 def upload_favicon_to_azure(favicon_data, company_id):
@@ -106,7 +244,10 @@ def upload_favicon_to_azure(favicon_data, company_id):
         blob_name = f"{company_id}.png"
 
         # Upload to Azure Blob Storage
-        container_client.upload_blob(blob_name, png_buffer, overwrite=True)
+        with crawler_metrics.stage("upload") as upload:
+            upload.bytes = len(favicon_data)
+            container_client.upload_blob(
+                blob_name, png_buffer, overwrite=True)
 
         # Generate and return the Blob URL
         return f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME}/{blob_name}"
@@ -116,68 +257,98 @@ def upload_favicon_to_azure(favicon_data, company_id):
         return None
 
 
-def process_company(company, db_path):
-    """Process a single company to download favicon and update the database."""
-    company_id, website = company
-    print(f"Processing website: {website}")
-    favicon_url = get_favicon_url(website)
+def store_favicon(cursor, company_id, favicon_data):
+    """Store the favicon of a company and point the company to it.
 
-    if not favicon_url:
-        print(f"No valid favicon URL for website: {website}")
-        return
+    An image with the same hash is reused, otherwise the favicon is uploaded and
+    added to `company_images`. Called once per company with the winner of
+    `fetch_best_favicon`, the candidate threads never touch the database.
+    Returns True when the company got its favicon.
+    """
+    # Calculate the hash of the favicon
+    with crawler_metrics.stage("hash"):
+        image_hash = calculate_image_hash(favicon_data)
 
-    favicon_data = download_and_convert_favicon(favicon_url)
+    # Check if the hash already exists in `company_images`
+    with crawler_metrics.stage("db_lookup"):
+        cursor.execute(
+            "SELECT id, image_url FROM company_images WHERE image_hash = ?", (image_hash,))
+        existing_image = cursor.fetchone()
+
+    if existing_image:
+        # Reuse the existing image
+        image_id, image_url = existing_image
+        print(f"Reusing existing favicon for company ID {
+              company_id}, URL: {image_url}.")
+    else:
+        # Upload favicon to Azure Blob Storage
+        blob_url = upload_favicon_to_azure(favicon_data, company_id)
+        if not blob_url:
+            return False
+
+    with crawler_metrics.stage("db_write"):
+        if not existing_image:
+            # Another worker may have stored the same image since the lookup,
+            # its row wins and this upload is left unused
+            cursor.execute("""
+                INSERT INTO company_images (company_id, image_url, image_hash) VALUES (?, ?, ?)
+                ON CONFLICT (image_hash) DO NOTHING
+            """, (company_id, blob_url, image_hash))
+            cursor.execute(
+                "SELECT id FROM company_images WHERE image_hash = ?", (image_hash,))
+            image_id = cursor.fetchone()[0]
+            print(f"Favicon added for company ID {
+                  company_id} with URL: {blob_url}.")
 
-    if favicon_data:
-        # Calculate the hash of the favicon
-        image_hash = calculate_image_hash(favicon_data)
+        # Update the `companies` table with the new `image_id`
+        cursor.execute(
+            "UPDATE companies SET image_id = ? WHERE id = ?", (
+                image_id, company_id)
+        )
 
-        try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
+    return True
 
-            # Check if the hash already exists in `company_images`
-            cursor.execute(
-                "SELECT id, image_url FROM company_images WHERE image_hash = ?", (image_hash,))
-            existing_image = cursor.fetchone()
-
-            if existing_image:
-                # Reuse the existing image
-                image_id, image_url = existing_image
-                print(f"Reusing existing favicon for company ID {
-                      company_id}, URL: {image_url}.")
-            else:
-                # Upload favicon to Azure Blob Storage
-                blob_url = upload_favicon_to_azure(favicon_data, company_id)
-                if not blob_url:
-                    print(f"Failed to upload favicon for website: {website}.")
-                    return
-
-                # Insert the new image into `company_images`
-                cursor.execute(
-                    "INSERT INTO company_images (company_id, image_url, image_hash) VALUES (?, ?, ?)",
-                    (company_id, blob_url, image_hash)
-                )
-                image_id = cursor.lastrowid
-                print(f"Favicon added for company ID {
-                      company_id} with URL: {blob_url}.")
-
-            # Update the `companies` table with the new `image_id`
-            cursor.execute(
-                "UPDATE companies SET image_id = ? WHERE id = ?", (
-                    image_id, company_id)
-            )
 
+def process_company(company, db_path):
+    """Process a single company to download favicon and update the database.
+
+    Returns True when the company got its favicon.
+    """
+    company_id, website = company
+    print(f"Processing website: {website}")
+    candidates, manifest_urls = get_favicon_candidates(website)
+    # Only the winner comes back: the lookup and insert below run once, on this thread
+    favicon_data = fetch_best_favicon(candidates, manifest_urls)
+
+    if not favicon_data:
+        print(f"Failed to download favicon for website: {website}.")
+        return False
+
+    try:
+        # Waits for the other workers instead of failing with "database is locked"
+        conn = sqlite3.connect(db_path, timeout=DB_LOCK_TIMEOUT)
+        try:
+            stored = store_favicon(conn.cursor(), company_id, favicon_data)
             conn.commit()
+        finally:
             conn.close()
-        except Exception as e:
-            print(f"Error updating database for company ID {company_id}: {e}")
-    else:
-        print(f"Failed to download favicon for website: {website}.")
+    except Exception as e:
+        print(f"Error updating database for company ID {company_id}: {e}")
+        return False
+
+    if not stored:
+        print(f"Failed to upload favicon for website: {website}.")
 
+    return stored
 
-def update_favicons_in_db(db_path, max_workers=10):
-    """Read company data from the SQLite database and update favicons."""
+
+def update_favicons_in_db(db_path, max_workers=10, progress_interval=10, summary_path=None):
+    """Read company data from the SQLite database and update favicons.
+
+    A progress line is printed every `progress_interval` seconds and a JSON summary
+    of every stage (latency, outcomes by error class, concurrency) at the end,
+    also written to `summary_path` if given.
+    """
     initialize_database(db_path)  # Ensure the database schema is ready
 
     try:
@@ -190,14 +361,21 @@ def update_favicons_in_db(db_path, max_workers=10):
         conn.close()
 
         print(f"Found {len(companies)} companies to process.")
-        time.sleep(5)
+        crawler_metrics.reset(total_sites=len(companies))
 
         # Use ThreadPoolExecutor for parallel processing
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            executor.map(lambda company: process_company(
-                company, db_path), companies)
+        with crawler_metrics.report_progress(progress_interval):
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                executor.map(lambda company: crawler_metrics.site_finished(
+                    process_company(company, db_path)), companies)
 
         print("Database update complete.")
+        print(crawler_metrics.progress_line())
+        summary = crawler_metrics.summary_json()
+        print(summary)
+        if summary_path:
+            with open(summary_path, "w") as summary_file:
+                summary_file.write(summary)
     except Exception as e:
         print(f"Error updating favicons in database: {e}")
 
@@ -246,4 +424,4 @@ if __name__ == "__main__":
     database_path = "backend/companies.db"  # Path to your SQLite database
     # Adjust max_workers as needed based on your system resources
     # update_favicons_in_db(database_path, 5)
-    delete_duplicate_websites(database_path)
+    merge_duplicate_websites(database_path)